@@ -1,173 +1,355 @@
 import os
-from openai import OpenAI
-import subprocess
-import json
+import asyncio
 import time
 from pathlib import Path
-import queue
-import threading
+
+import file_tools
+from backends import create_backend
+from blob_store import BlobStore, join_messages
+from cache import ResponseCache
+from memory import ConversationMemory
+from metrics import Metrics
+from policy import RequestPolicy
+from ratelimit import RateLimiter
+from snapshots import SnapshotStore
+from stream_exec import exec_limits_from_env, run_streaming
 
 class Agent:
-    def __init__(self, name, role, comm_queue, openrouter_model, api_key=None):
+    def __init__(self, name, role, comm_queue, openrouter_model, api_key=None, persistent_session=True, backend="opencode", workspace_dir=None, cache=None, metrics=None, fallback_models=None, policy=None, snapshots=None):
         self.name = name
         self.role = role
         self.comm_queue = comm_queue
         self.openrouter_model = openrouter_model
         self.openrouter_api_key = api_key # Use the provided API key
-        self.workspace_dir = Path("/Users/mohammadsaad/Desktop/SICA/SICA 7/two-agent-framework/sandbox")
-        self.workspace_dir.mkdir(exist_ok=True)
+        self.workspace_dir = Path(workspace_dir) if workspace_dir else Path(__file__).resolve().parent / "sandbox"
+        self.workspace_dir.mkdir(parents=True, exist_ok=True)
         
-        # No direct OpenAI client here; interaction is via OpenCode CLI
-        self.messages = [] # Still useful for local tracking of conversation flow
+        self.messages = ConversationMemory.from_env() # Local record of the conversation, compacted to AGENT_CONTEXT_BUDGET
+        self.blobs = BlobStore(self.workspace_dir) # Large tool outputs, stored once and passed by reference
+        self.overlap_tools = False # Forward the reply before running its tool (set by the Orchestrator)
+        self.metrics = metrics if metrics is not None else Metrics() # Per-turn latency and resource measurements
+        # Incremental snapshot before every mutating tool call (AGENT_SNAPSHOTS); share one store per workspace
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore.from_env(self.workspace_dir)
+
+        # Model traffic goes through a pluggable backend: the OpenCode CLI (one warm
+        # worker per agent) or a pooled, streaming OpenAI-compatible client
+        self.backend = backend if not isinstance(backend, str) else create_backend(backend, self, persistent_session=persistent_session)
+
+        # Optional reply cache (AGENT_CACHE_MODE); the state digest chains every
+        # exchange so a key also covers the conversation that led up to it
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self._cache_state = ""
+
+        # Fallback models, adaptive timeouts, retries, hedging and per-key rate limits for every prompt
+        self.policy = policy or RequestPolicy.from_env(
+            [openrouter_model] + list(fallback_models or []),
+            observer=lambda **attempt: self.metrics.record("model_attempt", self.name, **attempt),
+            limiter=RateLimiter.from_env(),
+            api_key=api_key
+        )
 
-    def send_message(self, recipient_agent, message_content):
+    def send_message(self, recipient_agent, message_content, follow_up=False):
         print(f"\n{self.name} sent a message to {recipient_agent.name}.") # Concise confirmation
-        recipient_agent.comm_queue.put((self.name, message_content))
+        self.metrics.record("message", self.name, recipient=recipient_agent.name, chars=len(str(message_content)), follow_up=follow_up)
+        if follow_up:
+            # Extra message for a turn already answered; it does not start a new turn
+            recipient_agent.comm_queue.put((self.name, message_content, True))
+        else:
+            recipient_agent.comm_queue.put((self.name, message_content))
 
-    def receive_message(self):
+    async def areceive_message(self, timeout=None):
+        """Await the next message on an orchestrator Mailbox instead of polling.
+
+        Follow-up messages (e.g. a tool result sent after an overlapped reply)
+        are held and merged in front of the next regular message.
+        """
+        parts = []
+        started = time.perf_counter()
         try:
-            sender, message = self.comm_queue.get(timeout=10) # Wait for message
-            self.messages.append({"role": "user", "content": message}) # Add to own history
-            return sender, message
-        except queue.Empty:
+            while True:
+                item = await asyncio.wait_for(self.comm_queue.get(), timeout)
+                sender, message = item[:2]
+                parts.append(message)
+                if len(item) < 3: # Regular message: this is the agent's turn
+                    break
+        except asyncio.TimeoutError:
             return None, None
+        self.metrics.record("queue_wait", self.name, duration_s=time.perf_counter() - started)
+        message = join_messages(parts)
+        self.messages.append({"role": "user", "content": str(message)}) # Add to own history (previews only)
+        return sender, message
 
     def add_message(self, role, content):
         self.messages.append({"role": role, "content": content})
 
-    def _run_shell_command(self, cmd_list, cwd=None, timeout=120):
-        """Internal helper to run shell commands."""
+    def _run_shell_command(self, cmd_list, cwd=None, timeout=120, limits=None, on_output=None):
+        """Internal helper to run shell commands.
+
+        Output is read as it is produced (see stream_exec). With limits (a dict
+        like exec_limits_from_env()), only its head and tail are kept and the
+        command is killed past the byte or time limit, returning what it had
+        printed so far. on_output(stream, text) gets the output live.
+        """
         env = os.environ.copy()
         env['OPENROUTER_API_KEY'] = self.openrouter_api_key # Ensure API key is in env
+        limits = {'timeout': timeout, **(limits or {})}
         
         try:
-            result = subprocess.run(
-                cmd_list,
-                capture_output=True,
-                text=True,
-                env=env,
-                cwd=str(cwd if cwd else self.workspace_dir),
-                timeout=timeout
-            )
+            run = run_streaming(cmd_list, cwd=str(cwd if cwd else self.workspace_dir), env=env, on_output=on_output, **limits)
+        except FileNotFoundError:
             return {
-                'success': result.returncode == 0,
-                'output': result.stdout,
-                'error': result.stderr,
+                'success': False,
+                'error': f"Command not found: {cmd_list[0]}. Ensure it's in your PATH.",
                 'model_used': self.openrouter_model
             }
-        except subprocess.TimeoutExpired:
+        except Exception as e:
             return {
-                'success': False, 
-                'error': 'Command execution timed out',
+                'success': False,
+                'error': f"An error occurred: {e}",
                 'model_used': self.openrouter_model
             }
-        except FileNotFoundError:
+
+        self._record_subprocess(cmd_list, run['spawn_s'], run['duration_s'], run['killed'] or run['exit_code'])
+        if run['killed']:
+            reason = (f"Command execution timed out after {limits['timeout']:g}s" if run['killed'] == "timeout"
+                      else f"Command printed more than {limits['max_bytes']} bytes")
+            partial = "\n".join(text for text in (run['stdout'], run['stderr']) if text)
             return {
                 'success': False,
-                'error': f"Command not found: {cmd_list[0]}. Ensure it's in your PATH.",
+                'output': run['stdout'],
+                'error': f"{reason} and was killed." + (f" Output so far:\n{partial}" if partial else ""),
+                'exit_code': run['exit_code'],
+                'truncated': True,
                 'model_used': self.openrouter_model
             }
-        except Exception as e:
+        return {
+            'success': run['exit_code'] == 0,
+            'output': run['stdout'],
+            'error': run['stderr'],
+            'exit_code': run['exit_code'],
+            'truncated': run['truncated'],
+            'model_used': self.openrouter_model
+        }
+
+    def _record_subprocess(self, cmd_list, spawn_s, duration_s, exit_code):
+        self.metrics.record(
+            "subprocess", self.name,
+            command=" ".join(cmd_list[:2]), # e.g. "opencode bash"; arguments stay out of the labels
+            spawn_s=spawn_s,
+            duration_s=duration_s,
+            exit_code=exit_code
+        )
+
+    def opencode_run_prompt(self, prompt, session_id=None, on_chunk=None, cache_prompt=None):
+        """Send a prompt to the agent's model backend for conversational interaction.
+
+        With the OpenCode backend this reuses the agent's persistent worker session
+        and falls back to a cold `opencode run`. Streaming backends call
+        on_chunk(text) for every token as it arrives. Replies are served from
+        and stored in the response cache when one is configured; cache_prompt,
+        if given, is the text keyed on instead of prompt, for prompts that
+        carry per-run detail (timings, counts) a replay could never match.
+
+        Latency, time to first token and prompt/reply sizes go to self.metrics.
+        """
+        started = time.perf_counter()
+        first_chunk = []
+
+        def timed_chunk(text):
+            if not first_chunk:
+                first_chunk.append(time.perf_counter())
+            on_chunk(text)
+
+        result = self._cached_run_prompt(prompt, session_id, timed_chunk if on_chunk else None, cache_prompt)
+        finished = time.perf_counter()
+        self.metrics.record(
+            "model_call", self.name,
+            model=result.get('model_used', self.openrouter_model),
+            duration_s=finished - started,
+            ttft_s=(first_chunk[0] if first_chunk else finished) - started,
+            prompt_chars=len(prompt),
+            response_chars=len(result.get('output') or ''),
+            success=result['success'],
+            cached=bool(result.get('cached'))
+        )
+        return result
+
+    def _cached_run_prompt(self, prompt, session_id, on_chunk, cache_prompt=None):
+        if self.cache is None:
+            return self.policy.run(self.backend, prompt, session_id=session_id, on_chunk=on_chunk)
+
+        key = self.cache.key(self.openrouter_model, prompt if cache_prompt is None else cache_prompt, session_id or self._cache_state)
+        cached = self.cache.get(key)
+        if cached is not None:
+            # The backend never saw this exchange; let it catch up its history
+            self.backend.remember(prompt, cached['output'], session_id=session_id)
+            result = dict(cached, cached=True)
+        elif self.cache.mode == "replay":
             return {
                 'success': False,
-                'error': f"An error occurred: {e}",
+                'error': f"Replay cache miss for prompt (key {key[:12]})",
                 'model_used': self.openrouter_model
             }
+        else:
+            result = self.policy.run(self.backend, prompt, session_id=session_id, on_chunk=on_chunk)
+            if not result['success']:
+                return result
+            self.cache.put(key, {k: result[k] for k in ('success', 'output', 'error', 'model_used') if k in result})
 
-    def opencode_run_prompt(self, prompt, session_id=None):
-        """Send a prompt to the OpenCode CLI agent for conversational interaction."""
-        cmd = [
-            'opencode', 'run',
-            '-m', f"openrouter/{self.openrouter_model}",
-            prompt # Pass prompt as positional argument
-        ]
-        if session_id:
-            cmd.extend(['--session', session_id])
-        return self._run_shell_command(cmd)
+        if session_id is None:
+            self._cache_state = self.cache.key(self.openrouter_model, result['output'], key)
+        return result
 
-    def opencode_view_file(self, file_path):
-        """View the contents of a file using OpenCode CLI."""
-        cmd = [
-            'opencode', 'view',
-            file_path
-        ]
-        return self._run_shell_command(cmd)
+    def close(self):
+        """Release the agent's backend (stops the persistent OpenCode worker)."""
+        self.backend.close()
+
+    def _snapshot_before(self, tool):
+        """Snapshot the workspace before a mutating tool call; returns the snapshot id, or None."""
+        if self.snapshots is None:
+            return None
+        started = time.perf_counter()
+        try:
+            snapshot = self.snapshots.snapshot(label=f"{self.name}: before {tool}")
+        except OSError as e:
+            print(f"\nWorkspace snapshot before {tool} failed: {e}") # The tool still runs, just without a rollback point
+            return None
+        self.metrics.record(
+            "snapshot", self.name,
+            duration_s=time.perf_counter() - started,
+            files=snapshot['files'],
+            linked=snapshot['linked'],
+            copied=snapshot['copied']
+        )
+        return snapshot['id']
+
+    def restore_snapshot(self, snapshot_id):
+        """Roll the workspace back to a snapshot, rewriting only the files that differ.
+
+        The workspace is snapshotted first, so a restore can itself be undone.
+        """
+        if self.snapshots is None:
+            return {'success': False, 'output': '', 'error': 'Workspace snapshots are disabled (AGENT_SNAPSHOTS=0)', 'model_used': self.openrouter_model}
+        try:
+            self.snapshots.manifest(snapshot_id) # Unknown id: fail before taking a snapshot
+            before = self._snapshot_before("restore")
+            restored = self.snapshots.restore(snapshot_id)
+        except (OSError, ValueError) as e:
+            return {'success': False, 'output': '', 'error': f"Could not restore snapshot {snapshot_id}: {e}", 'model_used': self.openrouter_model}
+        return {
+            'success': True,
+            'output': f"Restored snapshot {snapshot_id}: {restored['restored']} file(s) rewritten, {restored['removed']} removed",
+            'error': '',
+            'snapshot': before,
+            'model_used': self.openrouter_model
+        }
 
-    def opencode_edit_file(self, file_path, description):
-        """Edit a file using OpenCode CLI with a description of changes."""
+    def fork_workspace(self, snapshot_id, dest_dir):
+        """Copy a snapshot into a new, empty sandbox so an alternative branch can run there.
+
+        Pass the returned path as another Agent's workspace_dir.
+        """
+        if self.snapshots is None:
+            raise ValueError("Workspace snapshots are disabled (AGENT_SNAPSHOTS=0)")
+        return self.snapshots.fork(snapshot_id, dest_dir)
+
+    def opencode_view_file(self, file_path, offset=None, length=None, start_line=None, end_line=None):
+        """View a file in the workspace, in-process (mmap for large files).
+
+        Pass offset/length for a byte range or start_line/end_line for a 1-based line window.
+        """
+        result = file_tools.view_file(self.workspace_dir, file_path, offset=offset, length=length, start_line=start_line, end_line=end_line)
+        result['model_used'] = self.openrouter_model
+        return result
+
+    def opencode_edit_file(self, file_path, description=None, old_string=None, new_string=None, replace_all=False):
+        """Edit a file in the workspace.
+
+        An exact old_string -> new_string replacement runs in-process; a free-form
+        description of the change is still handed to the OpenCode CLI.
+        """
+        if old_string is None and not description:
+            return {'success': False, 'output': '', 'error': f"Nothing to edit in {file_path}: pass --description or old_string/new_string", 'model_used': self.openrouter_model}
+        snapshot = self._snapshot_before("opencode edit")
+        if old_string is not None:
+            result = file_tools.edit_file(self.workspace_dir, file_path, old_string, new_string or "", replace_all=replace_all)
+            result['model_used'] = self.openrouter_model
+            result['snapshot'] = snapshot
+            return result
         cmd = [
             'opencode', 'edit',
             file_path,
             '--description', description
         ]
-        return self._run_shell_command(cmd)
+        result = self._run_shell_command(cmd, limits=exec_limits_from_env())
+        result['snapshot'] = snapshot
+        return result
 
     def opencode_write_file(self, file_path, content):
-        """Write content to a new file using OpenCode CLI."""
-        cmd = [
-            'opencode', 'write',
-            file_path,
-            '--content', content
-        ]
-        return self._run_shell_command(cmd)
+        """Atomically write content to a file in the workspace, in-process."""
+        snapshot = self._snapshot_before("opencode write")
+        result = file_tools.write_file(self.workspace_dir, file_path, content)
+        result['model_used'] = self.openrouter_model
+        result['snapshot'] = snapshot
+        return result
 
-    def opencode_bash_command(self, command):
-        """Execute a bash command using OpenCode CLI."""
+    def opencode_bash_command(self, command, on_output=None):
+        """Execute a bash command using OpenCode CLI.
+
+        Output streams to on_output(stream, text) while it runs. It is capped
+        by AGENT_BASH_* limits (see stream_exec.exec_limits_from_env).
+        """
+        snapshot = self._snapshot_before("opencode bash")
         cmd = [
             'opencode', 'bash',
             command
         ]
-        return self._run_shell_command(cmd)
+        result = self._run_shell_command(cmd, limits=exec_limits_from_env(), on_output=on_output)
+        result['snapshot'] = snapshot
+        return result
+
+    def reflect_and_improve(self, task_success, state_file="agent_state.db"):
+        """Enhanced reflection with OpenCode-driven improvements.
+
+        Outcomes and suggestions are appended to the workspace's StateStore;
+        an existing agent_state.json is imported into it once.
+        """
+        from state_store import StateStore # sqlite3 is only needed at the end of a cycle
+        store = StateStore(self.workspace_dir / state_file)
+
+        # Update success rate (from running totals, not a scan of every upgrade)
+        success_rate = store.success_rate(task_success)
+
+        # Measurements from this cycle, so suggestions can target what was actually slow or failing
+        measured = self.metrics.window_summary(self.name)
+        store.record_cycle(self.name, self.openrouter_model, task_success, measured)
 
-    def reflect_and_improve(self, task_success, state_file="agent_state.json"):
-        """Enhanced reflection with OpenCode-driven improvements"""
-        state_file_path = self.workspace_dir / state_file
-        try:
-            with open(state_file_path, "r") as f:
-                state = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            state = {
-                "upgrades": [],
-                "success_rate": 1.0,
-                "capabilities": [],
-                "model_used": self.openrouter_model
-            }
-        
-        # Update success rate
-        current_successes = len([u for u in state["upgrades"] if u.get("successful", True)])
-        total_attempts = len(state["upgrades"]) + 1
-        state["success_rate"] = (current_successes + (1 if task_success else 0)) / total_attempts
-        
         # Trigger improvements if success rate drops below threshold
-        if not task_success or state["success_rate"] < 0.8:
+        if not task_success or success_rate < 0.8:
             improvement_prompt = f"""
             Analyze my current capabilities and suggest improvements.
-            Current success rate: {state['success_rate']:.2f}
+            Current success rate: {success_rate:.2f}
             Last task success: {task_success}
             Available tools: OpenCode CLI, file operations, shell commands
             Suggest specific code improvements or new tool integrations.
             """
+            latency = f"{measured['model_latency_avg_s']:.2f}s avg" if measured['model_latency_avg_s'] is not None else "n/a"
+            measurements = f"""
+            Last cycle: {measured['turns']} turns ({measured['turn_failures']} failed), {measured['model_calls']} model calls ({measured['model_failures']} failed, latency {latency}), {measured['tool_calls']} tool calls ({measured['tool_failures']} failed)
+            """
             
-            # Use opencode_run_prompt for reflection
-            improvement_result = self.opencode_run_prompt(improvement_prompt)
+            # Use opencode_run_prompt for reflection. The measurements change every
+            # run, so the cache keys on the fixed text only and replays still match
+            improvement_result = self.opencode_run_prompt(improvement_prompt + measurements, cache_prompt=improvement_prompt)
             
             if improvement_result['success']:
                 # Implement the suggested improvement (this part needs careful design)
                 # For now, we'll just log the suggestion
                 print(f"\n{self.name} suggests improvement: {improvement_result['output']}")
-                state["upgrades"].append({
-                    "timestamp": time.time(),
-                    "suggestion": improvement_result['output'],
-                    "successful": True # Assume success for now, actual implementation is complex
-                })
+                store.add_upgrade(self.name, self.openrouter_model, improvement_result['output'],
+                                  successful=True, # Assume success for now, actual implementation is complex
+                                  metrics=measured)
             else:
                 print(f"\n{self.name} failed to suggest improvement: {improvement_result['error']}")
-                state["upgrades"].append({
-                    "timestamp": time.time(),
-                    "suggestion": "Failed to generate improvement",
-                    "successful": False
-                })
-        
-        # Save updated state
-        with open(state_file_path, "w") as f:
-            json.dump(state, f, indent=2)
+                store.add_upgrade(self.name, self.openrouter_model, "Failed to generate improvement",
+                                  successful=False, metrics=measured)
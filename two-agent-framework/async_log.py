@@ -0,0 +1,137 @@
+import os
+import queue
+import atexit
+import shutil
+import threading
+from pathlib import Path
+
+_STOP = object()
+
+
+def log_options_from_env():
+    """Rotation settings from AGENT_LOG_MAX_MB (0 = never rotate), AGENT_LOG_BACKUPS and AGENT_LOG_GZIP."""
+    max_mb = float(os.getenv("AGENT_LOG_MAX_MB", "0"))
+    return {
+        'max_bytes': int(max_mb * 1024 * 1024) or None,
+        'backups': int(os.getenv("AGENT_LOG_BACKUPS", "5")),
+        'compress': os.getenv("AGENT_LOG_GZIP", "1") not in ("0", "false", "no"),
+    }
+
+
+class AsyncFileWriter:
+    """Text log written by a background thread.
+
+    write() only puts the text on a bounded queue (it blocks when the writer
+    falls queue_size items behind). The writer thread drains the queue into a
+    buffered file and flushes once the queue has been idle for flush_interval
+    seconds, not once per write. With max_bytes set, the file is rotated to
+    <name>.1 ... <name>.<backups>, gzipped unless compress is False.
+    """
+
+    def __init__(self, path, mode="a", max_bytes=None, backups=5, compress=True, queue_size=10000, flush_interval=0.2):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, mode, buffering=64 * 1024)
+        self._size = self._file.tell()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{self.path.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text):
+        if text and not self._closed:
+            self._queue.put(text)
+        return len(text)
+
+    def flush(self):
+        """Block until everything written so far is on disk (not needed on the hot path)."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if dirty else None)
+            except queue.Empty:
+                self._file.flush() # Idle: one flush for everything since the last one
+                dirty = False
+                continue
+
+            if item is _STOP:
+                self._file.close()
+                return
+            if isinstance(item, threading.Event):
+                self._file.flush()
+                dirty = False
+                item.set()
+                continue
+
+            self._file.write(item)
+            self._size += len(item) # Characters; close enough to bytes for rotation
+            dirty = True
+            if self.max_bytes and self._size >= self.max_bytes:
+                self._rotate()
+                dirty = False
+
+    def _backup(self, index):
+        return self.path.with_name(f"{self.path.name}.{index}" + (".gz" if self.compress else ""))
+
+    def _rotate(self):
+        import gzip # Only needed once a log is rotated
+        self._file.close()
+        oldest = self._backup(self.backups)
+        if oldest.exists():
+            oldest.unlink()
+        for index in range(self.backups - 1, 0, -1):
+            if self._backup(index).exists():
+                os.replace(self._backup(index), self._backup(index + 1))
+        if self.backups > 0:
+            if self.compress:
+                with open(self.path, "rb") as src, gzip.open(self._backup(1), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                self.path.unlink()
+            else:
+                os.replace(self.path, self._backup(1))
+        self._file = open(self.path, "w", buffering=64 * 1024)
+        self._size = 0
+
+
+class ConversationLog:
+    """sys.stdout replacement: live console output plus a log file written in the background.
+
+    The console is still written (and flushed) right away so streamed tokens
+    show up live; the log file never blocks the agent loop on disk I/O.
+    """
+
+    def __init__(self, log, console=None):
+        self.log = log
+        self.console = console
+
+    def write(self, text):
+        if self.console is not None:
+            self.console.write(text)
+            self.console.flush()
+        return self.log.write(text)
+
+    def flush(self):
+        if self.console is not None:
+            self.console.flush()
+
+    def isatty(self):
+        return False
@@ -0,0 +1,194 @@
+import os
+import threading
+
+from memory import ConversationMemory
+from ratelimit import is_rate_limited, retry_after_from_text
+from session import OpenCodeSession
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class OpenCodeBackend:
+    """Model traffic through the OpenCode CLI (persistent worker, cold `opencode run` fallback)."""
+
+    name = "opencode"
+
+    def __init__(self, agent, persistent_session=True):
+        self.agent = agent
+        self.session = OpenCodeSession(agent.openrouter_model, api_key=agent.openrouter_api_key, cwd=agent.workspace_dir) if persistent_session else None
+        self._unsent = [] # Exchanges answered from the cache that the session has not seen
+
+    def remember(self, prompt, output, session_id=None):
+        """Record an exchange served from the cache so the next real prompt can carry it."""
+        if session_id is None:
+            self._unsent.append((prompt, output))
+
+    def run_prompt(self, prompt, session_id=None, on_chunk=None, model=None, timeout=120):
+        """Send a prompt with the agent's model, or `model` for this call only (fallbacks)."""
+        # The CLI returns whole replies, so on_chunk is never called
+        unsent = self._unsent if session_id is None else []
+        if unsent:
+            # Replay cached exchanges once so the server-side session has the full context
+            transcript = "\n\n".join(f"User: {p}\n\nAssistant: {o}" for p, o in unsent)
+            prompt = f"Earlier in this conversation:\n\n{transcript}\n\nUser: {prompt}"
+            self._unsent = []
+        result = self._send(prompt, session_id, model or self.agent.openrouter_model, timeout)
+        if not result['success'] and (result.get('rate_limited') or is_rate_limited(result.get('error'))):
+            # The CLI only reports provider 429s as text
+            result['rate_limited'] = True
+            result.setdefault('retry_after', retry_after_from_text(result.get('error')))
+            result['error'] = f"Rate limited by provider: {result.get('error')}"
+        if unsent and not result['success']:
+            self._unsent = unsent + self._unsent # Keep them for the retry
+        return result
+
+    def _send(self, prompt, session_id, model, timeout):
+        if session_id is None and self.session is not None:
+            if self.session.start():
+                return self.session.run_prompt(prompt, timeout=timeout, model=model)
+            session_id = self.session.session_id
+
+        cmd = [
+            'opencode', 'run',
+            '-m', f"openrouter/{model}",
+            prompt # Pass prompt as positional argument
+        ]
+        if session_id:
+            cmd.extend(['--session', session_id])
+        result = self.agent._run_shell_command(cmd, timeout=timeout)
+        result['model_used'] = model
+        return result
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class OpenAIBackend:
+    """Direct calls to an OpenAI-compatible API (OpenRouter by default) with token streaming.
+
+    Clients are pooled per (API key, base URL), so every agent sharing a key
+    reuses the same HTTP connection pool. The API is stateless, so the
+    conversation history is kept here, one token-budgeted ConversationMemory
+    per session id, and older turns are compacted instead of resent in full.
+    """
+
+    name = "openai"
+
+    _clients = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, model, api_key=None, base_url=None, timeout=120):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL)
+        self.timeout = timeout
+        self.histories = {} # session id -> ConversationMemory
+
+    @classmethod
+    def get_client(cls, api_key, base_url):
+        """Return the shared client for this key, creating it on first use."""
+        with cls._clients_lock:
+            client = cls._clients.get((api_key, base_url))
+            if client is None:
+                from openai import OpenAI # Only needed when this backend is selected
+                client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0) # RequestPolicy owns retries
+                cls._clients[(api_key, base_url)] = client
+            return client
+
+    def _history(self, session_id):
+        history = self.histories.get(session_id or "default")
+        if history is None:
+            history = self.histories[session_id or "default"] = ConversationMemory.from_env()
+        return history
+
+    def remember(self, prompt, output, session_id=None):
+        """Add an exchange served from the cache to the local history."""
+        history = self._history(session_id)
+        history.add("user", prompt)
+        history.add("assistant", output)
+
+    def complete(self, prompt, session_id=None, on_chunk=None, model=None, timeout=None, cancelled=None):
+        """Stream a reply without adding it to the history.
+
+        on_chunk(text) is called for every token delta as it arrives. Setting the
+        `cancelled` event stops reading the stream (a hedged request that lost).
+        """
+        import openai
+
+        model = model or self.model
+        messages = self._history(session_id).to_chat_messages() + [{"role": "user", "content": prompt}]
+        pieces = []
+        try:
+            raw = self.get_client(self.api_key, self.base_url).chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                timeout=timeout or self.timeout
+            )
+            headers = dict(raw.headers) # Rate-limit feedback for the scheduler
+            stream = raw.parse()
+            for chunk in stream:
+                if cancelled is not None and cancelled.is_set():
+                    stream.close()
+                    return {
+                        'success': False,
+                        'error': 'Cancelled: another model answered first',
+                        'cancelled': True,
+                        'model_used': model
+                    }
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    pieces.append(text)
+                    if on_chunk:
+                        on_chunk(text)
+        except openai.APITimeoutError:
+            return {
+                'success': False,
+                'error': 'Command execution timed out',
+                'model_used': model
+            }
+        except openai.RateLimitError as e:
+            return {
+                'success': False,
+                'error': f"Rate limited by provider (HTTP 429): {e}",
+                'rate_limited': True,
+                'headers': dict(e.response.headers),
+                'model_used': model
+            }
+        except openai.APIError as e:
+            return {
+                'success': False,
+                'error': f"OpenAI-compatible API request failed: {e}",
+                'model_used': model
+            }
+
+        return {
+            'success': True,
+            'output': ''.join(pieces),
+            'error': '',
+            'model_used': model,
+            'headers': headers,
+            'streamed': bool(pieces and on_chunk)
+        }
+
+    def run_prompt(self, prompt, session_id=None, on_chunk=None, model=None, timeout=None):
+        """Stream a reply and add the exchange to the session's history."""
+        result = self.complete(prompt, session_id=session_id, on_chunk=on_chunk, model=model, timeout=timeout)
+        if result['success']:
+            self.remember(prompt, result['output'], session_id=session_id)
+        return result
+
+    def close(self):
+        pass # Pooled clients outlive a single agent
+
+
+def create_backend(kind, agent, persistent_session=True):
+    """Build the backend named by `kind` ("opencode" or "openai") for an agent."""
+    if kind in (None, "opencode"):
+        return OpenCodeBackend(agent, persistent_session=persistent_session)
+    if kind == "openai":
+        return OpenAIBackend(agent.openrouter_model, api_key=agent.openrouter_api_key)
+    raise ValueError(f"Unknown backend: {kind}")
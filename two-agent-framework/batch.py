@@ -0,0 +1,99 @@
+import os
+import re
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+
+def load_missions(path):
+    """Read missions from a JSONL file.
+
+    Each line is a JSON object. The id comes from `id`, `mission_id` or
+    `request_id` (falling back to the line number), and the instructions from
+    `instructions`, `mission` or `title` + `body`, so a requests.jsonl backlog
+    works as-is.
+    """
+    missions = []
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            mission_id = str(record.get("id") or record.get("mission_id") or record.get("request_id") or f"mission-{line_no}")
+            instructions = record.get("instructions") or record.get("mission")
+            if not instructions:
+                instructions = "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            missions.append({"id": mission_id, "instructions": instructions})
+    return missions
+
+
+def _safe_dirname(mission_id):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", mission_id).strip("._") or "mission"
+
+
+def _run_one(mission, args, mission_dir):
+    """Worker-process entry point: one Alpha/Beta pair in its own sandbox."""
+    from main import run_mission # Imported in the worker, after the fork
+
+    os.makedirs(mission_dir, exist_ok=True)
+    record = {"id": mission["id"]}
+    try:
+        result = run_mission(
+            mission["instructions"],
+            args,
+            workspace_dir=os.path.join(mission_dir, "sandbox"),
+            log_filename=os.path.join(mission_dir, "conversation.log"),
+            console=False
+        )
+        record.update(result)
+    except Exception as e:
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    return record
+
+
+def run_batch(missions_path, args, concurrency=4, results_path=None, batch_dir=None):
+    """Run every mission in missions_path, up to `concurrency` at once.
+
+    Each mission gets an isolated directory under batch_dir holding its
+    sandbox and conversation log. The default, batches/<timestamp>, sits
+    next to conversations/ and outside every agent workspace, so no agent's
+    commands, snapshots or restores reach another mission's files. One JSON record per mission is appended to
+    results_path as soon as it finishes.
+    """
+    missions = load_missions(missions_path)
+    if batch_dir is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        batch_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batches", timestamp)
+    os.makedirs(batch_dir, exist_ok=True)
+    results_path = results_path or os.path.join(batch_dir, "batch_results.jsonl")
+
+    print(f"Running {len(missions)} missions with concurrency {concurrency} in {batch_dir}")
+    started = time.time()
+    counts = {}
+    used_dirs = set()
+    with open(results_path, "a") as results, ProcessPoolExecutor(max_workers=concurrency) as pool:
+        futures = {}
+        for mission in missions:
+            # Keep directories unique even if two missions share an id
+            name = _safe_dirname(mission["id"])
+            while name in used_dirs:
+                name += "_"
+            used_dirs.add(name)
+            futures[pool.submit(_run_one, mission, args, os.path.join(batch_dir, name))] = mission
+
+        for future in as_completed(futures):
+            mission = futures[future]
+            try:
+                record = future.result()
+            except BrokenProcessPool as e:
+                record = {"id": mission["id"], "status": "error", "error": f"Worker process died: {e}"}
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            counts[record.get("status")] = counts.get(record.get("status"), 0) + 1
+            print(f"[{sum(counts.values())}/{len(missions)}] {record['id']}: {record.get('status')}")
+
+    print(f"Batch finished in {time.time() - started:.1f}s: {counts}. Results: {results_path}")
+    return results_path
@@ -0,0 +1,199 @@
+"""Orchestration benchmark against the fake `opencode` CLI (fake_opencode.py).
+
+Runs Alpha and Beta through N cycles with scripted model replies and tool
+calls, so the numbers measure this code rather than OpenRouter:
+
+    python benchmark.py --cycles 20 --reply-delay 0.05 --tool-calls 2 --output bench_output.txt
+
+Reports throughput (turns/s), per-turn overhead (turn time not spent in the
+model or in tools), model transport overhead, tool-dispatch latency and
+traced memory growth across cycles.
+"""
+import os
+import sys
+import json
+import stat
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop against a fake opencode CLI.")
+    parser.add_argument("--cycles", type=int, default=10, help="Measured cycles")
+    parser.add_argument("--warmup", type=int, default=1, help="Cycles run first and left out of the results")
+    parser.add_argument("--reply-delay", type=float, default=0.0, help="Seconds the fake model takes per reply")
+    parser.add_argument("--reply-chars", type=int, default=500, help="Approximate size of each reply")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls in each reply")
+    parser.add_argument("--tool-delay", type=float, default=0.0, help="Seconds each fake tool call takes")
+    parser.add_argument("--tool-output-chars", type=int, default=200, help="Size of each tool output")
+    parser.add_argument("--script", help="JSON list of replies to use instead of generated ones")
+    parser.add_argument("--cold", action="store_true", help="Use cold `opencode run` calls instead of the persistent worker")
+    parser.add_argument("--overlap-tools", action="store_true", help="Forward replies before running their tools")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def install_fake_cli(bin_dir, args):
+    """Put an `opencode` shim for fake_opencode.py first on PATH and configure it."""
+    shim = Path(bin_dir) / "opencode"
+    shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{HERE / "fake_opencode.py"}" "$@"\n')
+    shim.chmod(shim.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    os.environ.update({
+        "FAKE_OPENCODE_DELAY": str(args.reply_delay),
+        "FAKE_OPENCODE_REPLY_CHARS": str(args.reply_chars),
+        "FAKE_OPENCODE_TOOL_CALLS": str(args.tool_calls),
+        "FAKE_OPENCODE_TOOL_DELAY": str(args.tool_delay),
+        "FAKE_OPENCODE_TOOL_OUTPUT_CHARS": str(args.tool_output_chars),
+        "AGENT_CACHE_MODE": "off", # Every turn must reach the fake model
+    })
+    if args.script:
+        os.environ["FAKE_OPENCODE_SCRIPT"] = str(Path(args.script).resolve())
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(events, cycle_marks, args):
+    """Turn the metrics trace and per-cycle (time, traced bytes) marks into the report."""
+    start = cycle_marks[args.warmup - 1][0] if args.warmup else cycle_marks[0][0] - cycle_marks[0][2]
+    end = cycle_marks[-1][0]
+    measured = [e for e in events if start < e["ts"] <= end]
+    turns = [e for e in measured if e["event"] == "turn"]
+    models = [e for e in measured if e["event"] == "model_call"]
+    tools = [e for e in measured if e["event"] == "tool_call"]
+    spawns = [e for e in measured if e["event"] == "subprocess"]
+
+    # Overhead: the part of each turn spent neither waiting for the model nor in a tool
+    overheads = []
+    for turn in turns:
+        begin = turn["ts"] - turn["duration_s"]
+        inside = sum(
+            e["duration_s"] for e in models + tools
+            if e["agent"] == turn["agent"] and begin <= e["ts"] <= turn["ts"]
+        )
+        overheads.append(max(turn["duration_s"] - inside, 0.0))
+
+    memory = [mark[1] for mark in cycle_marks[max(args.warmup - 1, 0):]]
+    wall = end - start
+    return {
+        "cycles": args.cycles,
+        "turns": len(turns),
+        "failed_turns": sum(1 for t in turns if not t["success"]),
+        "wall_s": wall,
+        "turns_per_s": len(turns) / wall if wall > 0 else None,
+        "turn_s_mean": _mean([t["duration_s"] for t in turns]),
+        "turn_overhead_s_mean": _mean(overheads),
+        "turn_overhead_s_p95": _percentile(overheads, 0.95),
+        "model_calls": len(models),
+        "model_transport_s_mean": _mean([m["duration_s"] - args.reply_delay for m in models]),
+        "tool_calls": len(tools),
+        "tool_dispatch_s_mean": _mean([t["duration_s"] - args.tool_delay for t in tools]),
+        "tool_dispatch_s_p95": _percentile([t["duration_s"] - args.tool_delay for t in tools], 0.95),
+        "subprocess_spawn_s_mean": _mean([s["spawn_s"] for s in spawns]),
+        "memory_start_bytes": memory[0],
+        "memory_end_bytes": memory[-1],
+        "memory_growth_bytes_per_cycle": (memory[-1] - memory[0]) / (len(memory) - 1) if len(memory) > 1 else 0,
+        "memory_peak_bytes": max(mark[3] for mark in cycle_marks),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("json", "output")},
+    }
+
+
+def format_report(report):
+    def ms(value):
+        return "n/a" if value is None else f"{value * 1000:.2f} ms"
+
+    rate = report["turns_per_s"]
+    lines = [
+        f"Cycles measured:          {report['cycles']} ({report['turns']} turns, {report['failed_turns']} failed)",
+        f"Throughput:               {'n/a' if rate is None else f'{rate:.2f}'} turns/s",
+        f"Turn time (mean):         {ms(report['turn_s_mean'])}",
+        f"Per-turn overhead:        {ms(report['turn_overhead_s_mean'])} mean, {ms(report['turn_overhead_s_p95'])} p95",
+        f"Model transport overhead: {ms(report['model_transport_s_mean'])} mean over {report['model_calls']} calls",
+        f"Tool dispatch latency:    {ms(report['tool_dispatch_s_mean'])} mean, {ms(report['tool_dispatch_s_p95'])} p95 over {report['tool_calls']} calls",
+        f"Subprocess spawn:         {ms(report['subprocess_spawn_s_mean'])} mean",
+        f"Traced memory:            {report['memory_start_bytes'] / 1024:.1f} KiB -> {report['memory_end_bytes'] / 1024:.1f} KiB "
+        f"({report['memory_growth_bytes_per_cycle'] / 1024:+.1f} KiB/cycle, peak {report['memory_peak_bytes'] / 1024:.1f} KiB)",
+    ]
+    return "\n".join(lines)
+
+
+def run_benchmark(args):
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as tmp:
+        install_fake_cli(tmp, args)
+
+        # Imported after the environment is set up: agents read it at construction
+        from main import Alpha, Beta, assess_cycle_performance
+        from metrics import Metrics
+        from orchestrator import Mailbox, Orchestrator
+
+        trace_path = os.path.join(tmp, "trace.jsonl")
+        metrics = Metrics(trace_path=trace_path)
+        workspace = os.path.join(tmp, "sandbox")
+        alpha = Alpha("Agent1 (Alpha)", "Planner", Mailbox(), "fake/alpha", api_key="bench",
+                      persistent_session=not args.cold, workspace_dir=workspace, metrics=metrics)
+        agents = {
+            "alpha": alpha,
+            "beta": Beta("Agent2 (Beta)", "Executor", Mailbox(), "fake/beta", api_key="bench",
+                         persistent_session=not args.cold, workspace_dir=workspace, metrics=metrics,
+                         snapshots=alpha.snapshots), # One snapshot history for the shared sandbox
+        }
+
+        cycle_marks = [] # (time, traced bytes, cycle seconds, peak bytes) after each cycle
+        cycle_started = [time.time()]
+
+        def assess(agents):
+            current, peak = tracemalloc.get_traced_memory()
+            now = time.time()
+            cycle_marks.append((now, current, now - cycle_started[0], peak))
+            cycle_started[0] = now
+            return assess_cycle_performance(agents["alpha"], agents["beta"])
+
+        orchestrator = Orchestrator(agents, cycles=args.warmup + args.cycles, overlap_tools=args.overlap_tools, assess=assess)
+
+        # Agent output goes to a throwaway stream; only the report is printed
+        original_stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        tracemalloc.start()
+        try:
+            asyncio.run(orchestrator.run("Benchmark mission: exchange replies and run the tools you are given."))
+        finally:
+            tracemalloc.stop()
+            sys.stdout.close()
+            sys.stdout = original_stdout
+            for agent in agents.values():
+                agent.close()
+            metrics.close()
+
+        with open(trace_path) as f:
+            events = [json.loads(line) for line in f]
+        return summarize(events, cycle_marks, args)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2) if args.json else format_report(report)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+
+
+class BlobRef:
+    """Lightweight handle to a stored blob: digest, size and a short preview."""
+
+    __slots__ = ("store", "digest", "size", "preview")
+
+    def __init__(self, store, digest, size, preview):
+        self.store = store
+        self.digest = digest
+        self.size = size
+        self.preview = preview
+
+    @property
+    def relpath(self):
+        # Path relative to the workspace, so agents can page through it with `opencode view`
+        return self.store.path(self.digest).relative_to(self.store.workspace_dir)
+
+    def load(self):
+        return self.store.get(self.digest)
+
+    def __str__(self):
+        return f"{self.preview}\n... [{self.size} bytes total; full text in {self.relpath}]"
+
+    def render(self, max_inline):
+        """Full text if it is at most max_inline characters, otherwise the preview and where to read the rest."""
+        if self.size <= max_inline:
+            return self.load()
+        return (f"{self.preview}\n... [{self.size} bytes total. The full text is in {self.relpath}; "
+                f"read it with `opencode view` and start_line/end_line.]")
+
+
+class LazyMessage:
+    """A message whose large parts are BlobRefs, resolved only when the recipient builds its prompt.
+
+    str() gives the preview form, which is what goes into conversation
+    history; resolve() loads the blobs.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts):
+        self.parts = parts # str or BlobRef
+
+    def __str__(self):
+        return "".join(str(part) for part in self.parts)
+
+    def __bool__(self):
+        return any(self.parts)
+
+    def resolve(self, max_inline=64 * 1024):
+        return "".join(part.render(max_inline) if isinstance(part, BlobRef) else part for part in self.parts)
+
+
+def join_messages(messages, sep="\n\n"):
+    """Join plain and lazy messages, staying lazy only if one of them is."""
+    if all(isinstance(m, str) for m in messages):
+        return sep.join(messages)
+    parts = []
+    for index, message in enumerate(messages):
+        if index:
+            parts.append(sep)
+        parts.extend(message.parts if isinstance(message, LazyMessage) else [message])
+    return LazyMessage(parts)
+
+
+def resolve_message(message):
+    return message.resolve() if isinstance(message, LazyMessage) else message
+
+
+class BlobStore:
+    """Content-addressed store for large tool outputs inside the workspace.
+
+    Each distinct output is written once under <workspace>/.blobs/<ab>/<sha256>.txt.
+    Outputs at or under `threshold` characters are passed around as plain strings.
+    """
+
+    def __init__(self, workspace_dir, threshold=8 * 1024, preview_chars=1000):
+        self.workspace_dir = Path(workspace_dir).resolve()
+        self.root = self.workspace_dir / ".blobs"
+        self.threshold = threshold
+        self.preview_chars = preview_chars
+
+    def path(self, digest):
+        return self.root / digest[:2] / f"{digest}.txt"
+
+    def put(self, text):
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not path.exists(): # Same content, same blob: written once
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_name, path)
+        return BlobRef(self, digest, len(data), text[:self.preview_chars])
+
+    def get(self, digest):
+        return self.path(digest).read_text()
+
+    def wrap(self, text):
+        """Store text if it is large; returns the text itself or a BlobRef."""
+        if len(text) <= self.threshold:
+            return text
+        return self.put(text)
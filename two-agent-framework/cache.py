@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+CACHE_MODES = ("off", "readwrite", "record", "replay")
+
+
+class ResponseCache:
+    """Content-addressed cache for model replies.
+
+    Keys hash (model, prompt, session state). Lookups go to an in-memory LRU
+    first, then to one JSON file per key on disk. The disk tier is trimmed
+    oldest-first when it grows past max_disk_bytes.
+
+    Modes:
+    - readwrite: serve hits, call the model on misses and store the reply
+    - record: always call the model and store (overwrite) every reply
+    - replay: never call the model; a miss is an error, so a recorded
+      conversation re-runs offline and deterministically
+    """
+
+    def __init__(self, cache_dir, mode="readwrite", memory_entries=256, max_disk_bytes=256 * 1024 * 1024):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None # Computed on first write
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from AGENT_CACHE_* variables; returns None when caching is off."""
+        mode = os.getenv("AGENT_CACHE_MODE", "off")
+        if mode == "off":
+            return None
+        cache_dir = os.getenv("AGENT_CACHE_DIR", str(Path(__file__).resolve().parent / ".llm_cache"))
+        max_mb = float(os.getenv("AGENT_CACHE_MAX_MB", "256"))
+        return cls(cache_dir, mode=mode, max_disk_bytes=int(max_mb * 1024 * 1024))
+
+    @staticmethod
+    def key(model, prompt, state=""):
+        payload = json.dumps([model, state, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached reply for key, or None. Always None in record mode."""
+        if self.mode == "record":
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            os.utime(path) # Mark as recently used for disk eviction
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, entry)
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """Store a reply in both tiers. Writes are atomic, so concurrent runs can share a cache dir."""
+        if self.mode == "replay":
+            return
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = json.dumps(entry).encode()
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        try:
+            previous = path.stat().st_size
+        except FileNotFoundError:
+            previous = 0
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._remember(key, entry)
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _scan_disk_bytes(self):
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+
+    def _evict_disk(self):
+        # Drop least recently used files until the tier is back under 90% of its cap
+        files = sorted(self.cache_dir.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        target = self.max_disk_bytes * 0.9
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= target:
+                break
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            self._memory.pop(path.stem, None)
+            total -= size
+        self._disk_bytes = total
@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from ratelimit import key_fingerprint
+
+DEFAULT_CACHE = Path(__file__).with_name(".opencode_probe.json")
+
+
+def cli_fingerprint(executable="opencode"):
+    """Identity of the installed CLI binary (resolved path, size, mtime), or None if it is not on PATH.
+
+    Upgrading or reinstalling the CLI changes it, which is what invalidates a
+    cached `--version` probe; computing it costs one stat, not a subprocess.
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class ProbeCache:
+    """Results of the startup probes (`opencode --version`, `opencode auth login`) from earlier runs.
+
+    Entries are keyed on the CLI fingerprint; auth results additionally on a
+    hash of the API key, never the key itself. A new CLI binary drops every
+    entry, and a new key only re-runs the login. The file is rewritten
+    atomically, so concurrent batch processes never see a partial cache.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("AGENT_PROBE_CACHE") or DEFAULT_CACHE)
+        try:
+            with open(self.path) as f:
+                self._data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._data = {}
+
+    def version(self, cli):
+        """The cached `--version` output for this binary, or None if it has to be probed."""
+        if cli is None or self._data.get("cli") != cli:
+            return None
+        return self._data.get("version")
+
+    def authenticated(self, cli, api_key):
+        return cli is not None and self._data.get("cli") == cli and key_fingerprint(api_key) in self._data.get("auth", [])
+
+    def record(self, cli, version=None, api_key=None):
+        if cli is None:
+            return
+        if self._data.get("cli") != cli:
+            self._data = {"cli": cli}
+        if version is not None:
+            self._data["version"] = version
+        if api_key is not None:
+            auth = self._data.setdefault("auth", [])
+            if key_fingerprint(api_key) not in auth:
+                auth.append(key_fingerprint(api_key))
+        self._save()
+
+    def clear(self):
+        self._data = {}
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp) # A stale cache only costs the probes next time
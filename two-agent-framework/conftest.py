@@ -0,0 +1,24 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import mock_openrouter
+
+
+@pytest.fixture
+def openrouter():
+    """Start a mock OpenRouter on a free port; returns start(limit, window) -> (base_url, stats)."""
+    servers = []
+
+    def start(limit=20, window=60.0):
+        handler, stats = mock_openrouter.make_handler(limit, window, 0.0)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/v1", stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
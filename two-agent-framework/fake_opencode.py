@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Stand-in for the `opencode` CLI, for benchmarks and offline runs.
+
+Implements the subcommands the agents use: `serve` (the HTTP session API),
+`run`, `bash`, `edit` and `--version`. Replies are scripted and shaped by
+environment variables:
+
+    FAKE_OPENCODE_DELAY              seconds before each model reply (default 0)
+    FAKE_OPENCODE_REPLY_CHARS        approximate size of each reply (default 500)
+    FAKE_OPENCODE_TOOL_CALLS         `opencode bash` calls per reply (default 1)
+    FAKE_OPENCODE_TOOL_DELAY         seconds each `opencode bash` takes (default 0)
+    FAKE_OPENCODE_TOOL_OUTPUT_CHARS  size of each tool output (default 200)
+    FAKE_OPENCODE_SCRIPT             JSON file with a list of replies, used in turn instead of generated ones
+
+No model is called and nothing in the workspace is changed.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tool_parser import CALLS_BEGIN, CALLS_END, CALL_BEGIN, CALL_END, SEP
+
+VERSION = "0.0.0-fake"
+
+
+def _env(name, default, cast=float):
+    return cast(os.getenv(name, default))
+
+
+def _load_script():
+    path = os.getenv("FAKE_OPENCODE_SCRIPT")
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def scripted_reply(number, script=None):
+    """Reply number `number` (1-based): the script entry, or filler text plus tool-call blocks."""
+    time.sleep(_env("FAKE_OPENCODE_DELAY", "0"))
+    if script:
+        return script[(number - 1) % len(script)]
+
+    calls = "".join(
+        f"{CALL_BEGIN}function{SEP}opencode bash echo reply {number} call {index}{CALL_END}"
+        for index in range(_env("FAKE_OPENCODE_TOOL_CALLS", "1", int))
+    )
+    head = f"Reply {number}. "
+    size = _env("FAKE_OPENCODE_REPLY_CHARS", "500", int)
+    filler = ("lorem ipsum " * (size // 12 + 1))[:max(size - len(head), 0)]
+    return head + filler + (f"{CALLS_BEGIN}{calls}{CALLS_END}" if calls else "")
+
+
+def serve(host, port):
+    script = _load_script()
+    sessions = {} # session id -> number of prompts
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/session':
+                session_id = f"ses_{uuid.uuid4().hex[:12]}"
+                sessions[session_id] = 0
+                reply = {'id': session_id}
+            elif self.path.endswith('/abort'):
+                reply = True # Replies are generated synchronously; nothing to stop
+            else:
+                session_id = self.path.split('/')[2]
+                sessions[session_id] = sessions.get(session_id, 0) + 1
+                text = scripted_reply(sessions[session_id], script)
+                reply = {'info': {'sessionID': session_id}, 'parts': [{'type': 'text', 'text': text}]}
+            body = json.dumps(reply).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+def main(argv):
+    if argv[:1] == ['--version']:
+        print(VERSION)
+    elif argv[:1] == ['serve']:
+        host = argv[argv.index('--hostname') + 1] if '--hostname' in argv else "127.0.0.1"
+        serve(host, int(argv[argv.index('--port') + 1]))
+    elif argv[:1] == ['run']:
+        # Cold path: no session state, so every reply is the first one
+        print(scripted_reply(1, _load_script()))
+    elif argv[:1] == ['bash']:
+        time.sleep(_env("FAKE_OPENCODE_TOOL_DELAY", "0"))
+        sys.stdout.write("x" * _env("FAKE_OPENCODE_TOOL_OUTPUT_CHARS", "200", int))
+    elif argv[:1] in (['edit'], ['auth']):
+        print("ok")
+    else:
+        print(f"fake opencode: unsupported arguments {argv}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
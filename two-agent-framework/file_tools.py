@@ -0,0 +1,133 @@
+import os
+import mmap
+import tempfile
+from pathlib import Path
+
+MMAP_THRESHOLD = 1024 * 1024 # Files at least this big are read through mmap
+MAX_VIEW_BYTES = 256 * 1024 # Cap for a view without an explicit range
+
+# os.umask can only be read by setting it, so do that once, at import, before any worker threads exist
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def resolve_path(workspace_dir, file_path):
+    """Resolve file_path against the workspace, refusing anything that escapes it (.., absolute paths, symlinks)."""
+    root = Path(workspace_dir).resolve()
+    path = (root / file_path).resolve()
+    if path != root and root not in path.parents:
+        raise ValueError(f"Path is outside the workspace: {file_path}")
+    return path
+
+
+def _resolve_file(workspace_dir, file_path):
+    # Write targets must name a file: the root or a directory would only fail at
+    # os.replace, after mkstemp had already created a temp file next to it
+    path = resolve_path(workspace_dir, file_path)
+    if path == Path(workspace_dir).resolve() or path.is_dir():
+        raise IsADirectoryError(f"Not a file: {file_path or '.'}")
+    return path
+
+
+def _line_window(mm, start_line, end_line):
+    # Byte offsets of 1-based, inclusive lines start_line..end_line
+    start = 0
+    for _ in range(start_line - 1):
+        start = mm.find(b"\n", start)
+        if start == -1:
+            return len(mm), len(mm)
+        start += 1
+    if end_line is None:
+        return start, len(mm)
+    end = start
+    for _ in range(end_line - start_line + 1):
+        end = mm.find(b"\n", end)
+        if end == -1:
+            return start, len(mm)
+        end += 1
+    return start, end
+
+
+def _optional_int(value):
+    # Ranges come from model-written JSON, so "10" is as likely as 10
+    return None if value is None else int(value)
+
+
+def view_file(workspace_dir, file_path, offset=None, length=None, start_line=None, end_line=None):
+    """Read a file in the workspace, optionally a byte range or a line window.
+
+    Large files and ranged reads go through mmap, so only the requested pages
+    are touched. Without a range, output is capped at MAX_VIEW_BYTES.
+    """
+    try:
+        offset, length = _optional_int(offset), _optional_int(length)
+        start_line, end_line = _optional_int(start_line), _optional_int(end_line)
+        path = resolve_path(workspace_dir, file_path)
+        size = path.stat().st_size
+        ranged = offset is not None or length is not None or start_line is not None or end_line is not None
+
+        if size == 0:
+            return {'success': True, 'output': '', 'error': ''}
+        if not ranged and size < MMAP_THRESHOLD:
+            with open(path, "rb") as f:
+                output = f.read(MAX_VIEW_BYTES).decode(errors="replace")
+            truncated = size > MAX_VIEW_BYTES
+        else:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if start_line is not None or end_line is not None:
+                    start, end = _line_window(mm, max(start_line or 1, 1), end_line)
+                else:
+                    start = max(offset or 0, 0)
+                    end = size if length is None else min(start + length, size)
+                truncated = not ranged and end - start > MAX_VIEW_BYTES
+                if truncated:
+                    end = start + MAX_VIEW_BYTES
+                output = mm[start:end].decode(errors="replace")
+
+        if truncated:
+            output += f"\n[truncated: file is {size} bytes; pass offset/length or start_line/end_line to read more]"
+        return {'success': True, 'output': output, 'error': ''}
+    except (OSError, TypeError, ValueError) as e:
+        return {'success': False, 'output': '', 'error': f"Could not view {file_path}: {e}"}
+
+
+def write_file(workspace_dir, file_path, content):
+    """Atomically write content to a file in the workspace (temp file + rename)."""
+    try:
+        path = _resolve_file(workspace_dir, file_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            if path.exists():
+                os.chmod(tmp_name, path.stat().st_mode) # Keep the existing file's permissions
+            else:
+                os.chmod(tmp_name, 0o666 & ~_UMASK) # mkstemp creates 0600; a new file follows the umask like open() would
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        return {'success': True, 'output': f"Wrote {len(content)} characters to {file_path}", 'error': ''}
+    except (OSError, ValueError) as e:
+        return {'success': False, 'output': '', 'error': f"Could not write {file_path}: {e}"}
+
+
+def edit_file(workspace_dir, file_path, old_string, new_string, replace_all=False):
+    """Replace old_string with new_string in a workspace file; old_string must be unique unless replace_all."""
+    try:
+        path = _resolve_file(workspace_dir, file_path)
+        content = path.read_text()
+    except (OSError, ValueError) as e:
+        return {'success': False, 'output': '', 'error': f"Could not edit {file_path}: {e}"}
+
+    count = content.count(old_string) if old_string else 0
+    if count == 0:
+        return {'success': False, 'output': '', 'error': f"Text to replace was not found in {file_path}"}
+    if count > 1 and not replace_all:
+        return {'success': False, 'output': '', 'error': f"Text to replace occurs {count} times in {file_path}; make it unique or set replace_all"}
+
+    result = write_file(workspace_dir, file_path, content.replace(old_string, new_string))
+    if result['success']:
+        result['output'] = f"Replaced {count if replace_all else 1} occurrence(s) in {file_path}"
+    return result
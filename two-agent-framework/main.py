@@ -1,192 +1,243 @@
 import os
+import argparse
+import asyncio
 import subprocess
-import queue
-import threading
 import time
-import json
 import sys
-import re
 from datetime import datetime
 
+from concurrent.futures import ThreadPoolExecutor
+
 from agent import Agent
-from config import AGENT1_API_KEY, AGENT2_API_KEY, AGENT1_MODEL, AGENT2_MODEL, OPENCODE_WORKSPACE
-
-# Custom stdout class to tee output to console and file
-class Tee(object):
-    def __init__(self, *files):
-        self.files = files
-    def write(self, obj):
-        for f in self.files:
-            f.write(obj)
-            f.flush() # Ensure immediate write
-    def flush(self):
-        for f in self.files:
-            f.flush()
-
-# Function to extract tool code from agent's response
-def extract_tool_code(response_content):
-    tool_code_pattern = re.compile(r'<\|tool calls begin\|><\|tool call begin\|>function<\|tool sep\|>(.*?)(?:<\|tool call end\|>)?<\|tool calls end\|>', re.DOTALL)
-    match = tool_code_pattern.search(response_content)
-    if match:
-        # Extract the content within the tool call block
-        tool_call_content = match.group(1).strip()
-        
-        # Remove the tool call block from the original response
-        cleaned_response = tool_code_pattern.sub('', response_content).strip()
-        
-        # The tool call content might contain the command and then JSON arguments
-        # We need to parse this carefully.
-        # Example: opencode run\n```json\n{"prompt": "..."}\n```
-        
-        # Split by newline to separate command from JSON (if any)
-        parts = tool_call_content.split('\n```json\n', 1)
-        command_line = parts[0].strip()
-        json_args = None
-        if len(parts) > 1:
-            json_block = parts[1].strip()
-            if json_block.endswith('\n```'):
-                json_block = json_block[:-len('\n```')].strip()
-            try:
-                json_args = json.loads(json_block)
-            except json.JSONDecodeError:
-                print(f"Warning: Could not parse JSON arguments for tool call: {json_block}")
-                json_args = None
-        
-        return cleaned_response, command_line, json_args
-    return response_content, None, None
+from async_log import AsyncFileWriter, ConversationLog, log_options_from_env
+from metrics import Metrics
+from blob_store import join_messages, resolve_message
+from cli_probe import ProbeCache, cli_fingerprint
+from tool_parser import ToolCallParser
+from orchestrator import DEFAULT_TOPOLOGY, Mailbox, Orchestrator
+
+class ConversationalAgent(Agent):
+    """Turn logic shared by Alpha and Beta: think, run the reply's tool calls, pass the results on."""
 
-class Alpha(Agent):
-    def __init__(self, name, role, comm_queue, openrouter_model, system_prompt=None, api_key=None):
-        super().__init__(name, role, comm_queue, openrouter_model, api_key=api_key) # Corrected super().__init__ call
+    def __init__(self, name, role, comm_queue, openrouter_model, system_prompt=None, api_key=None, persistent_session=True, backend="opencode", workspace_dir=None, metrics=None, fallback_models=None, snapshots=None):
+        super().__init__(name, role, comm_queue, openrouter_model, api_key=api_key, persistent_session=persistent_session, backend=backend, workspace_dir=workspace_dir, metrics=metrics, fallback_models=fallback_models, snapshots=snapshots)
         self.system_prompt = system_prompt # Store system prompt for initial message
+        self.last_response = None # Most recent cleaned model reply
+        self._streaming = False
+        self._tool_streaming = False
 
-    def run_turn(self, recipient_agent, message_to_process):
-        # Alpha's turn to process and send a message
-        print(f"\n{self.name} is thinking...")
-        
-        # Prepend system prompt to the first message
-        if not self.messages and self.system_prompt:
-            message_to_process = f"{self.system_prompt}\n\n{message_to_process}"
+    def _echo_chunk(self, text):
+        # Print the reply live as tokens stream in (only streaming backends call this)
+        if not self._streaming:
+            print(f"\n{self.name}: ", end="")
+            self._streaming = True
+        print(text, end="")
 
-        # Use opencode_run_prompt for conversational interaction
-        opencode_response = self.opencode_run_prompt(message_to_process)
-        
-        if opencode_response['success']:
-            raw_response = opencode_response['output']
-            cleaned_response, tool_command, tool_args = extract_tool_code(raw_response)
-            
-            print(f"\n{self.name}: {cleaned_response}")
-            
-            if tool_command:
-                print(f"\n{self.name} is executing tool: {tool_command} with args: {tool_args}")
-                tool_output = {'success': False, 'output': 'No tool executed.', 'error': ''}
-                
-                # Execute the tool command based on its type
-                if tool_command.startswith("opencode run"): # Conversational prompt
-                    prompt = tool_args.get("prompt", "") if tool_args else ""
-                    tool_output = self.opencode_run_prompt(prompt)
-                elif tool_command.startswith("opencode view"): # View file
-                    file_path = tool_command.split(" ", 2)[2].strip() # Extract file_path
-                    tool_output = self.opencode_view_file(file_path)
-                elif tool_command.startswith("opencode write"): # Write file
-                    file_path = tool_args.get("file_path", "") if tool_args else ""
-                    content = tool_args.get("content", "") if tool_args else ""
-                    tool_output = self.opencode_write_file(file_path, content)
-                elif tool_command.startswith("opencode bash"): # Bash command
-                    command = tool_command.split(" ", 2)[2].strip() # Extract command
-                    tool_output = self.opencode_bash_command(command)
-                # Add more tool types as needed
-
-                if tool_output['success']:
-                    print(f"\nTool Output (Success):\n{tool_output['output']}")
-                    self.add_message("tool_output", tool_output['output'])
-                    self.send_message(recipient_agent, f"Tool executed successfully. Output: {tool_output['output']}")
-                else:
-                    print(f"\nTool Output (Error):\n{tool_output['error']}")
-                    self.add_message("tool_error", tool_output['error'])
-                    self.send_message(recipient_agent, f"Tool execution failed. Error: {tool_output['error']}")
-            else:
-                self.send_message(recipient_agent, cleaned_response)
-        else:
-            print(f"\n{self.name} (OpenCode Error): {opencode_response['error']}")
-            self.send_message(recipient_agent, f"OpenCode execution failed: {opencode_response['error']}")
+    def _echo_tool_output(self, stream, text):
+        # Print bash output live while the command runs, so long builds show progress
+        if not self._tool_streaming:
+            print(f"\n{self.name} tool output (live):")
+            self._tool_streaming = True
+        print(text, end="")
 
-class Beta(Agent):
-    def __init__(self, name, role, comm_queue, openrouter_model, system_prompt=None, api_key=None):
-        super().__init__(name, role, comm_queue, openrouter_model, api_key=api_key) # Corrected super().__init__ call
-        self.system_prompt = system_prompt # Store system prompt for initial message
+    def execute_tool(self, tool_command, tool_args):
+        """Run one parsed tool call and record its result in the agent's history."""
+        print(f"\n{self.name} is executing tool: {tool_command} with args: {tool_args}")
+        tool_output = {'success': False, 'output': 'No tool executed.', 'error': ''}
+        started = time.perf_counter()
+
+        # Execute the tool command based on its type
+        try:
+            if tool_command.startswith("opencode run"): # Conversational prompt
+                prompt = tool_args.get("prompt", "") if tool_args else ""
+                tool_output = self.opencode_run_prompt(prompt)
+            elif tool_command.startswith("opencode view"): # View file, optionally a byte range or line window
+                args = tool_args or {}
+                parts = tool_command.split(" ", 2)
+                file_path = parts[2].strip() if len(parts) > 2 else args.get("file_path", "") # Extract file_path
+                tool_output = self.opencode_view_file(
+                    file_path,
+                    offset=args.get("offset"),
+                    length=args.get("length"),
+                    start_line=args.get("start_line"),
+                    end_line=args.get("end_line")
+                )
+            elif tool_command.startswith("opencode write"): # Write file
+                file_path = tool_args.get("file_path", "") if tool_args else ""
+                content = tool_args.get("content", "") if tool_args else ""
+                tool_output = self.opencode_write_file(file_path, content)
+            elif tool_command.startswith("opencode edit"): # Edit file: exact replacement or a description
+                args = tool_args or {}
+                parts = tool_command.split(" ", 2)
+                # "opencode edit <file_path> --description <description>", as the system prompts show it
+                file_path, _, description = (parts[2] if len(parts) > 2 else "").partition("--description")
+                tool_output = self.opencode_edit_file(
+                    file_path.strip() or args.get("file_path", ""),
+                    description=description.strip().strip("\"'") or args.get("description"),
+                    old_string=args.get("old_string"),
+                    new_string=args.get("new_string"),
+                    replace_all=args.get("replace_all", False)
+                )
+            elif tool_command.startswith("opencode bash"): # Bash command
+                command = tool_command.split(" ", 2)[2].strip() # Extract command
+                tool_output = self.opencode_bash_command(command, on_output=self._echo_tool_output)
+            elif tool_command.startswith("opencode restore"): # Roll the workspace back to a snapshot
+                parts = tool_command.split(" ", 2)
+                snapshot_id = parts[2].strip() if len(parts) > 2 else (tool_args or {}).get("snapshot", "")
+                tool_output = self.restore_snapshot(snapshot_id)
+            # Add more tool types as needed
+        except Exception as e:
+            # A malformed call from the model is a failed tool call, not a failed mission
+            tool_output = {'success': False, 'output': '', 'error': f"{' '.join(tool_command.split()[:2])} failed: {e}"}
+        self.metrics.record(
+            "tool_call", self.name,
+            tool=" ".join(tool_command.split()[:2]),
+            duration_s=time.perf_counter() - started,
+            success=tool_output['success'],
+            output_chars=len(tool_output.get('output') or tool_output.get('error') or '')
+        )
+
+        if tool_output.get('snapshot'):
+            note = f"\n[workspace snapshot {tool_output['snapshot']} was taken before this call; `opencode restore {tool_output['snapshot']}` undoes it]"
+            key = 'output' if tool_output['success'] else 'error'
+            tool_output[key] = (tool_output.get(key) or '') + note
+
+        # Large outputs go to the blob store once; from here on only the handle and preview travel
+        streamed, self._tool_streaming = self._tool_streaming, False
+        if tool_output['success']:
+            tool_output['output'] = self.blobs.wrap(tool_output['output'])
+            print("\nTool Output (Success): shown above" if streamed else f"\nTool Output (Success):\n{tool_output['output']}")
+            self.add_message("tool_output", str(tool_output['output']))
+        else:
+            tool_output['error'] = self.blobs.wrap(tool_output['error'])
+            print(f"\nTool Output (Error):\n{tool_output['error']}")
+            self.add_message("tool_error", str(tool_output['error']))
+        return tool_output
 
     def run_turn(self, recipient_agent, message_to_process):
         print(f"\n{self.name} is thinking...")
+        started = time.perf_counter()
+        outcome = {'success': False, 'tool_calls': 0}
+
+        # Load any blob-backed tool output now that this agent actually needs it
+        message_to_process = resolve_message(message_to_process)
 
         # Prepend system prompt to the first message
         if not self.messages and self.system_prompt:
             message_to_process = f"{self.system_prompt}\n\n{message_to_process}"
 
+        # Tool calls run in order on one worker thread. Calls that close while the
+        # reply is still streaming start right away, unless they prompt the model
+        # (`opencode run`), which has to wait until this reply is complete.
+        parser = ToolCallParser()
+        executor = ThreadPoolExecutor(max_workers=1)
+        futures = []
+        hold = [False] # Once a call is held back, later ones wait too to keep the order
+
+        def on_chunk(text):
+            self._echo_chunk(text)
+            for call in parser.feed(text):
+                hold[0] = hold[0] or call.command.startswith("opencode run")
+                if not hold[0]:
+                    futures.append(executor.submit(self.execute_tool, call.command, call.args))
+
         # Use opencode_run_prompt for conversational interaction
-        opencode_response = self.opencode_run_prompt(message_to_process)
-
-        if opencode_response['success']:
-            raw_response = opencode_response['output']
-            cleaned_response, tool_command, tool_args = extract_tool_code(raw_response)
-
-            print(f"\n{self.name}: {cleaned_response}")
-
-            if tool_command:
-                print(f"\n{self.name} is executing tool: {tool_command} with args: {tool_args}")
-                tool_output = {'success': False, 'output': 'No tool executed.', 'error': ''}
-                
-                # Execute the tool command based on its type
-                if tool_command.startswith("opencode run"): # Conversational prompt
-                    prompt = tool_args.get("prompt", "") if tool_args else ""
-                    tool_output = self.opencode_run_prompt(prompt)
-                elif tool_command.startswith("opencode view"): # View file
-                    file_path = tool_command.split(" ", 2)[2].strip() # Extract file_path
-                    tool_output = self.opencode_view_file(file_path)
-                elif tool_command.startswith("opencode write"): # Write file
-                    file_path = tool_args.get("file_path", "") if tool_args else ""
-                    content = tool_args.get("content", "") if tool_args else ""
-                    tool_output = self.opencode_write_file(file_path, content)
-                elif tool_command.startswith("opencode bash"): # Bash command
-                    command = tool_command.split(" ", 2)[2].strip() # Extract command
-                    tool_output = self.opencode_bash_command(command)
-                # Add more tool types as needed
-
-                if tool_output['success']:
-                    print(f"\nTool Output (Success):\n{tool_output['output']}")
-                    self.add_message("tool_output", tool_output['output'])
-                    self.send_message(recipient_agent, f"Tool executed successfully. Output: {tool_output['output']}")
+        self._streaming = False
+        try:
+            opencode_response = self.opencode_run_prompt(message_to_process, on_chunk=on_chunk)
+
+            if opencode_response['success']:
+                raw_response = opencode_response['output']
+                if not self._streaming:
+                    parser.feed(raw_response) # Reply arrived whole (CLI backend or cache hit)
+                parser.close()
+                cleaned_response, tool_calls = parser.text, parser.calls
+                self.last_response = cleaned_response
+
+                if self._streaming:
+                    print() # Reply was already printed while streaming
                 else:
-                    print(f"\nTool Output (Error):\n{tool_output['error']}")
-                    self.add_message("tool_error", tool_output['error'])
-                    self.send_message(recipient_agent, f"Tool execution failed. Error: {tool_output['error']}")
+                    print(f"\n{self.name}: {cleaned_response}")
+
+                if tool_calls:
+                    forwarded = self.overlap_tools and bool(cleaned_response)
+                    if forwarded:
+                        # Let the recipient start reasoning while the tools run
+                        self.send_message(recipient_agent, cleaned_response)
+
+                    for call in tool_calls[len(futures):]:
+                        futures.append(executor.submit(self.execute_tool, call.command, call.args))
+                    reports = []
+                    for number, (call, future) in enumerate(zip(tool_calls, futures), 1):
+                        tool_output = future.result()
+                        label = "Tool" if len(tool_calls) == 1 else f"Tool {number} ({call.command})"
+                        if tool_output['success']:
+                            reports.append(join_messages([f"{label} executed successfully. Output: ", tool_output['output']], sep=""))
+                        else:
+                            reports.append(join_messages([f"{label} execution failed. Error: ", tool_output['error']], sep=""))
+                    self.send_message(recipient_agent, join_messages(reports), follow_up=forwarded)
+                else:
+                    self.send_message(recipient_agent, cleaned_response)
+                outcome['success'] = True
+                outcome['tool_calls'] = len(tool_calls)
             else:
-                self.send_message(recipient_agent, cleaned_response)
-        else:
-            print(f"\n{self.name} (OpenCode Error): {opencode_response['error']}")
-            self.send_message(recipient_agent, f"OpenCode execution failed: {opencode_response['error']}")
+                print(f"\n{self.name} (OpenCode Error): {opencode_response['error']}")
+                self.send_message(recipient_agent, f"OpenCode execution failed: {opencode_response['error']}")
+        finally:
+            executor.shutdown(wait=True) # Calls already started by a failed stream still finish
+            self.metrics.record("turn", self.name, duration_s=time.perf_counter() - started, **outcome)
+
+class Alpha(ConversationalAgent):
+    """Agent1, the CEO/Planner."""
+
+class Beta(ConversationalAgent):
+    """Agent2, the Genius/Executor."""
 
 def assess_cycle_performance(alpha, beta):
-    """Assess whether the current cycle was successful"""
-    # Implement success metrics based on your specific criteria
-    # For now, return True for basic implementation
-    return True
+    """Assess whether the current cycle was successful, from the agents' measurements.
+
+    A cycle succeeds when every turn got a reply from the model and at most
+    half of the tool calls failed.
+    """
+    turns = turn_failures = tool_calls = tool_failures = 0
+    for agent in (alpha, beta):
+        measured = agent.metrics.window_summary(agent.name)
+        turns += measured['turns']
+        turn_failures += measured['turn_failures']
+        tool_calls += measured['tool_calls']
+        tool_failures += measured['tool_failures']
+    return turns > 0 and turn_failures == 0 and tool_failures * 2 <= tool_calls
 
-def setup_opencode_cli():
-    """Install and configure OpenCode CLI if not present"""
+def setup_opencode_cli(refresh=False):
+    """Install and configure OpenCode CLI if not present.
+
+    The version check and the auth login are skipped when an earlier run
+    already did them for the same CLI binary and API key (see cli_probe);
+    refresh=True re-runs both.
+    """
+    probe = ProbeCache()
+    if refresh:
+        probe.clear()
     try:
         # Check if OpenCode CLI is installed
-        result = subprocess.run(['opencode', '--version'], capture_output=True, text=True)
-        if result.returncode != 0:
-            print("Installing OpenCode CLI...")
-            subprocess.run([
-                'curl', '-fsSL', 
-                'https://raw.githubusercontent.com/opencode-ai/opencode/refs/heads/main/install'
-            ], shell=True, check=True) # Added check=True to raise error on failure
+        cli = cli_fingerprint()
+        version = probe.version(cli)
+        if version is None:
+            result = subprocess.run(['opencode', '--version'], capture_output=True, text=True)
+            if result.returncode != 0:
+                print("Installing OpenCode CLI...")
+                subprocess.run([
+                    'curl', '-fsSL', 
+                    'https://raw.githubusercontent.com/opencode-ai/opencode/refs/heads/main/install'
+                ], shell=True, check=True) # Added check=True to raise error on failure
+            else:
+                probe.record(cli, version=result.stdout.strip())
         
         # Configure authentication
-        api_key = os.getenv('AGENT1_API_KEY') # Use AGENT1_API_KEY for opencode auth
-        if api_key:
+        from config import AGENT1_API_KEY as api_key # Use AGENT1_API_KEY for opencode auth; config loads .env
+        if api_key and probe.authenticated(cli, api_key):
+            print("OpenCode CLI authentication unchanged since the last run; skipping login.")
+        elif api_key:
             print("Configuring OpenCode CLI authentication...")
             # OpenCode CLI auth login expects input on stdin
             process = subprocess.Popen(['opencode', 'auth', 'login', 'openrouter'], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -195,6 +246,7 @@ def setup_opencode_cli():
                 print(f"OpenCode CLI authentication failed: {stderr}")
                 return False
             print(f"OpenCode CLI authentication output: {stdout}")
+            probe.record(cli_fingerprint(), api_key=api_key)
         
         print("OpenCode CLI setup complete.")
         return True
@@ -210,20 +262,56 @@ def setup_opencode_cli():
         print(f"OpenCode CLI setup failed: {e}")
         return False
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the two-agent conversation.")
+    parser.add_argument("--cycles", type=int, default=1, help="Number of conversation cycles")
+    parser.add_argument("--topology", default=DEFAULT_TOPOLOGY,
+                        help="Turn order per cycle as speaker>recipient hops, e.g. 'alpha>beta,beta>alpha'")
+    parser.add_argument("--overlap-tools", action="store_true",
+                        help="Forward each reply before running its tool so the other agent can start reasoning")
+    parser.add_argument("--batch", metavar="MISSIONS_JSONL",
+                        help="Run every mission in a JSONL file instead of instructions.txt")
+    parser.add_argument("--concurrency", type=int, default=4, help="Missions run at once in batch mode")
+    parser.add_argument("--results", help="Batch results JSONL (default: batch_results.jsonl in the batch directory)")
+    parser.add_argument("--refresh-setup", action="store_true",
+                        help="Re-run the OpenCode CLI version check and auth login even if cached")
+    return parser.parse_args(argv)
+
+def run_mission(initial_instructions, args, workspace_dir=None, log_filename=None, console=True):
+    """Run one Alpha/Beta conversation and return a result record.
+
+    Output is logged to log_filename (a timestamped file in conversations/ by
+    default) and echoed to the console unless console is False.
+    """
+    # config.py is git-ignored; importing it here keeps the agent classes importable without it (benchmark.py)
+    from config import AGENT1_API_KEY, AGENT2_API_KEY, AGENT1_MODEL, AGENT2_MODEL, OPENCODE_WORKSPACE
+
     # Setup logging to file and console
-    log_dir = os.path.join(os.path.dirname(__file__), "conversations")
-    os.makedirs(log_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_filename = os.path.join(log_dir, f"conversation_{timestamp}.log")
-    
+    if log_filename is None:
+        log_dir = os.path.join(os.path.dirname(__file__), "conversations")
+        os.makedirs(log_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        log_filename = os.path.join(log_dir, f"conversation_{timestamp}.log")
+
+    # The log file is written by a background thread; the console stays live
+    log_options = log_options_from_env()
     original_stdout = sys.stdout
-    log_file = open(log_filename, "w")
-    sys.stdout = Tee(original_stdout, log_file)
+    log_file = AsyncFileWriter(log_filename, mode="w", **log_options)
+    sys.stdout = ConversationLog(log_file, console=original_stdout if console else None)
+
+    if workspace_dir is None:
+        workspace_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), OPENCODE_WORKSPACE or "sandbox")
 
+    # Per-event JSONL trace now, Prometheus snapshot at the end, both next to the log
+    log_stem = os.path.splitext(log_filename)[0]
+    metrics = Metrics(trace_path=f"{log_stem}.trace.jsonl", **log_options)
+
+    started = time.time()
+    result = {'log': log_filename, 'trace': f"{log_stem}.trace.jsonl", 'metrics': f"{log_stem}.prom"}
+    alpha = beta = None
     try:
-        comm_queue_alpha = queue.Queue() # Queue for Alpha to receive messages
-        comm_queue_beta = queue.Queue()  # Queue for Beta to receive messages
+        comm_queue_alpha = Mailbox() # Queue for Alpha to receive messages
+        comm_queue_beta = Mailbox()  # Queue for Beta to receive messages
         
         # Read system prompts
         ceo_prompt_path = os.path.join(os.path.dirname(__file__), "system_prompt_ceo.txt")
@@ -242,55 +330,68 @@ def main():
             genius_system_prompt = None
 
         # Create model-aligned agents with their respective API keys
-        alpha = Alpha("Agent1 (Alpha)", "Planner", comm_queue_alpha, AGENT1_MODEL, system_prompt=ceo_system_prompt, api_key=AGENT1_API_KEY)
-        beta = Beta("Agent2 (Beta)", "Executor", comm_queue_beta, AGENT2_MODEL, system_prompt=genius_system_prompt, api_key=AGENT2_API_KEY)
-        
-        # Load initial instructions
-        instructions_file_path = os.path.join(os.path.dirname(__file__), "instructions.txt")
-        try:
-            with open(instructions_file_path, "r") as f:
-                initial_instructions = f.read().strip()
-        except FileNotFoundError:
-            initial_instructions = "No instructions found. Agents will start a general conversation."
-        
+        backend = os.getenv("AGENT_BACKEND", "opencode") # "opencode" or "openai"
+        alpha_fallbacks = [m.strip() for m in os.getenv("AGENT1_FALLBACK_MODELS", "").split(",") if m.strip()]
+        beta_fallbacks = [m.strip() for m in os.getenv("AGENT2_FALLBACK_MODELS", "").split(",") if m.strip()]
+        alpha = Alpha("Agent1 (Alpha)", "Planner", comm_queue_alpha, AGENT1_MODEL, system_prompt=ceo_system_prompt, api_key=AGENT1_API_KEY, backend=backend, workspace_dir=workspace_dir, metrics=metrics, fallback_models=alpha_fallbacks)
+        beta = Beta("Agent2 (Beta)", "Executor", comm_queue_beta, AGENT2_MODEL, system_prompt=genius_system_prompt, api_key=AGENT2_API_KEY, backend=backend, workspace_dir=workspace_dir, metrics=metrics, fallback_models=beta_fallbacks, snapshots=alpha.snapshots) # One snapshot history for the shared sandbox
+        result['workspace'] = str(alpha.workspace_dir)
+
         print(f"\nInitial Instruction for Agents:\n{initial_instructions}\n")
 
-        # Sequential conversation loop
-        for cycle in range(1): # Limiting to 1 cycle for initial testing
-            print(f"\n=== Cycle {cycle + 1} ===")
-            
-            # Alpha starts the conversation
-            alpha.run_turn(beta, initial_instructions) # Alpha sends message to Beta
-
-            # Beta receives and responds
-            sender, msg = beta.receive_message()
-            if msg: # Only proceed if a message was received
-                beta.run_turn(alpha, msg) # Beta sends message to Alpha
-
-            # Alpha receives and responds
-            sender, msg = alpha.receive_message()
-            if msg: # Only proceed if a message was received
-                alpha.run_turn(beta, msg) # Alpha sends message to Beta
-
-            # Beta receives and responds (final turn for this cycle)
-            sender, msg = beta.receive_message()
-            if msg: # Only proceed if a message was received
-                beta.run_turn(alpha, msg) # Beta sends message to Alpha
-
-            # Performance assessment for self-improvement
-            task_success = assess_cycle_performance(alpha, beta)
-            alpha.reflect_and_improve(task_success)
-            beta.reflect_and_improve(task_success)
+        # Event-driven conversation loop
+        orchestrator = Orchestrator(
+            {"alpha": alpha, "beta": beta},
+            topology=args.topology,
+            cycles=args.cycles,
+            overlap_tools=args.overlap_tools,
+            assess=lambda agents: assess_cycle_performance(agents["alpha"], agents["beta"])
+        )
+        asyncio.run(orchestrator.run(initial_instructions))
 
         print("\nInteraction complete.")
+        result.update({
+            'status': 'completed',
+            'alpha_last_response': alpha.last_response,
+            'beta_last_response': beta.last_response
+        })
+        return result
 
     finally:
+        result['duration_s'] = round(time.time() - started, 3)
+
+        # Stop the persistent OpenCode workers
+        for agent in (alpha, beta):
+            if agent is not None:
+                agent.close()
+        metrics.write_prometheus(result['metrics'])
+        metrics.close()
+
         # Restore original stdout and close log file
         sys.stdout = original_stdout
         log_file.close()
 
+def main(args=None):
+    args = args or parse_args([])
+
+    if args.batch:
+        from batch import run_batch
+        run_batch(args.batch, args, concurrency=args.concurrency, results_path=args.results)
+        return
+
+    # Load initial instructions
+    instructions_file_path = os.path.join(os.path.dirname(__file__), "instructions.txt")
+    try:
+        with open(instructions_file_path, "r") as f:
+            initial_instructions = f.read().strip()
+    except FileNotFoundError:
+        initial_instructions = "No instructions found. Agents will start a general conversation."
+
+    run_mission(initial_instructions, args)
+
 if __name__ == "__main__":
-    if setup_opencode_cli():
-        main()
+    args = parse_args()
+    if setup_opencode_cli(refresh=args.refresh_setup):
+        main(args)
     else:
-        print("Failed to setup OpenCode CLI. Please install manually.")
\ No newline at end of file
+        print("Failed to setup OpenCode CLI. Please install manually.")
@@ -0,0 +1,133 @@
+import os
+from array import array
+
+SUMMARY_ROLE = "summary"
+DEFAULT_CONTEXT_BUDGET = 32000 # Estimated tokens; leaves room for the reply in common 64k+ context windows
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token); no tokenizer dependency."""
+    return max(1, len(text) // 4)
+
+
+def truncate_summary(entries, preview_chars=200, max_chars=4000):
+    """Default compaction: keep a short preview of each message and say how much was dropped.
+
+    An earlier summary in `entries` is merged line by line rather than nested,
+    and only the newest max_chars of previews are kept.
+    """
+    lines = []
+    for role, content in entries:
+        if role == SUMMARY_ROLE:
+            lines.extend(content.splitlines()[1:])
+            continue
+        preview = " ".join(content[:preview_chars].split())
+        elided = estimate_tokens(content) - estimate_tokens(preview) if len(content) > preview_chars else 0
+        lines.append(f"{role}: {preview}" + (f" ... [{elided} tokens elided]" if elided > 0 else ""))
+
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "[Summary of earlier messages]\n" + "\n".join(lines)
+
+
+class ConversationMemory:
+    """Token-budgeted message history with a compact storage layout.
+
+    Roles are interned into a byte array and token counts kept in an int
+    array next to the list of contents, instead of one dict per message.
+    When the running total passes max_tokens, the oldest messages (apart from
+    the first keep_first and the last keep_recent) are folded into a single
+    summary entry produced by `summarizer`.
+
+    It still behaves like the old list of {"role", "content"} dicts for
+    append(), len(), iteration and indexing.
+    """
+
+    def __init__(self, max_tokens=None, keep_first=1, keep_recent=6, summarizer=truncate_summary):
+        self.max_tokens = max_tokens
+        self.keep_first = keep_first
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self._role_names = []
+        self._role_ids = {}
+        self._roles = array("B")
+        self._tokens = array("I")
+        self._contents = []
+        self.total_tokens = 0
+        self.compactions = 0
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Budget from AGENT_CONTEXT_BUDGET (tokens, default DEFAULT_CONTEXT_BUDGET); 0 means unbounded."""
+        budget = int(os.getenv("AGENT_CONTEXT_BUDGET", str(DEFAULT_CONTEXT_BUDGET))) or None
+        return cls(max_tokens=budget, **kwargs)
+
+    def _role_id(self, role):
+        role_id = self._role_ids.get(role)
+        if role_id is None:
+            role_id = self._role_ids[role] = len(self._role_names)
+            self._role_names.append(role)
+        return role_id
+
+    def add(self, role, content):
+        tokens = estimate_tokens(content)
+        self._roles.append(self._role_id(role))
+        self._tokens.append(tokens)
+        self._contents.append(content)
+        self.total_tokens += tokens
+        if self.max_tokens is not None and self.total_tokens > self.max_tokens:
+            self.compact()
+
+    def append(self, message):
+        self.add(message["role"], message["content"])
+
+    def __len__(self):
+        return len(self._contents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {"role": self._role_names[self._roles[index]], "content": self._contents[index]}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def compact(self):
+        """Fold the oldest compactable messages into one summary until the budget fits."""
+        start = min(self.keep_first, len(self))
+        end = len(self) - self.keep_recent
+        if end - start < 2:
+            return False # Nothing worth folding; the budget is a soft limit
+
+        # Fold just enough of the oldest messages to get back under budget
+        excess = self.total_tokens - self.max_tokens
+        stop = start
+        freed = 0
+        while stop < end and freed <= excess:
+            freed += self._tokens[stop]
+            stop += 1
+        stop = max(stop, start + 2)
+
+        entries = [(self._role_names[self._roles[i]], self._contents[i]) for i in range(start, stop)]
+        summary = self.summarizer(entries)
+        if len(summary) > self.max_tokens:
+            # Keep the summary within about a quarter of the budget (max_tokens chars ~ max_tokens/4 tokens)
+            header, _, body = summary.partition("\n")
+            summary = f"{header}\n{body[-self.max_tokens:]}"
+        summary_tokens = estimate_tokens(summary)
+
+        removed = sum(self._tokens[start:stop])
+        self._roles[start:stop] = array("B", [self._role_id(SUMMARY_ROLE)])
+        self._tokens[start:stop] = array("I", [summary_tokens])
+        self._contents[start:stop] = [summary]
+        self.total_tokens += summary_tokens - removed
+        self.compactions += 1
+        return True
+
+    def to_chat_messages(self):
+        """Messages for a chat completions request; summaries are sent as system messages."""
+        return [
+            {"role": "system" if m["role"] == SUMMARY_ROLE else m["role"], "content": m["content"]}
+            for m in self
+        ]
@@ -0,0 +1,186 @@
+import json
+import time
+import threading
+from collections import defaultdict, deque
+
+from async_log import AsyncFileWriter
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HELP = {
+    "agent_turns_total": ("counter", "Agent turns by outcome."),
+    "agent_turn_seconds": ("histogram", "Wall time of a whole agent turn."),
+    "agent_model_calls_total": ("counter", "Model prompts by outcome (cached hits included)."),
+    "agent_model_latency_seconds": ("histogram", "Time from sending a prompt to the complete reply."),
+    "agent_model_ttft_seconds": ("histogram", "Time to the first streamed token (full latency for non-streaming backends)."),
+    "agent_prompt_chars_total": ("counter", "Characters sent to the model."),
+    "agent_response_chars_total": ("counter", "Characters received from the model."),
+    "agent_model_attempts_total": ("counter", "Individual model requests (retries, fallbacks and hedges) by model and outcome."),
+    "agent_model_attempt_seconds": ("histogram", "Latency of individual model requests by model."),
+    "agent_tool_calls_total": ("counter", "Tool calls by tool and outcome."),
+    "agent_tool_seconds": ("histogram", "Tool call latency."),
+    "agent_subprocess_spawn_seconds": ("histogram", "Time for Popen to start a subprocess."),
+    "agent_subprocess_exits_total": ("counter", "Subprocess exit codes (\"timeout\" or \"output_limit\" when killed)."),
+    "agent_queue_wait_seconds": ("histogram", "Time an agent waited for its next message."),
+    "agent_snapshot_seconds": ("histogram", "Time to snapshot the workspace before a mutating tool call."),
+    "agent_snapshot_files_total": ("counter", "Files captured in workspace snapshots, hardlinked (unchanged) or copied."),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """Per-run instrumentation for turns, model calls, tool calls, subprocesses, queue waits and snapshots.
+
+    Every event is appended to an optional JSON-lines trace (written by a
+    background AsyncFileWriter; writer_options are passed to it) and folded into
+    counters and histograms that prometheus_text() renders in the Prometheus
+    text format. A per-agent window (reset at the start of each cycle) gives
+    assess_cycle_performance and reflect_and_improve real numbers to work with.
+    """
+
+    def __init__(self, trace_path=None, **writer_options):
+        self._lock = threading.Lock()
+        self._trace = AsyncFileWriter(trace_path, **writer_options) if trace_path else None
+        self._counters = defaultdict(float) # (name, labels) -> value
+        self._histograms = {} # (name, labels) -> [bucket counts, sum, count]
+        self._window = defaultdict(lambda: defaultdict(float)) # agent -> field -> value
+        self._latencies = defaultdict(lambda: deque(maxlen=500)) # (agent, kind) -> recent seconds
+
+    @staticmethod
+    def _key(name, labels):
+        # Label values are strings in the exposition format; also keeps series sortable (exit code 0 vs "timeout")
+        return (name, tuple((k, str(v)) for k, v in labels))
+
+    def _inc(self, name, labels, value=1):
+        self._counters[self._key(name, labels)] += value
+
+    def _observe(self, name, labels, value):
+        key = self._key(name, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            hist = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                hist[0][i] += 1
+        hist[1] += value
+        hist[2] += 1
+
+    def record(self, event, agent, **fields):
+        """Record one event, e.g. record("tool_call", name, tool="opencode bash", duration_s=0.4, success=True)."""
+        entry = {"ts": round(time.time(), 6), "event": event, "agent": agent, **fields}
+        if self._trace:
+            self._trace.write(json.dumps(entry, default=str) + "\n")
+        with self._lock:
+            self._aggregate(entry)
+
+    def _aggregate(self, e):
+        agent = e["agent"]
+        a = (("agent", agent),)
+        window = self._window[agent]
+        status = "success" if e.get("success", True) else "failure"
+
+        if e["event"] == "turn":
+            self._inc("agent_turns_total", a + (("status", status),))
+            self._observe("agent_turn_seconds", a, e["duration_s"])
+            window["turns"] += 1
+            window["turn_failures"] += status == "failure"
+        elif e["event"] == "model_call":
+            self._inc("agent_model_calls_total", a + (("status", status), ("cached", str(bool(e.get("cached"))).lower())))
+            self._observe("agent_model_latency_seconds", a, e["duration_s"])
+            self._observe("agent_model_ttft_seconds", a, e["ttft_s"])
+            self._inc("agent_prompt_chars_total", a, e.get("prompt_chars", 0))
+            self._inc("agent_response_chars_total", a, e.get("response_chars", 0))
+            self._latencies[(agent, "model")].append(e["duration_s"])
+            window["model_calls"] += 1
+            window["model_failures"] += status == "failure"
+            window["model_seconds"] += e["duration_s"]
+        elif e["event"] == "model_attempt":
+            model = (("model", e["model"]),)
+            self._inc("agent_model_attempts_total", a + model + (("status", e["status"]), ("hedged", str(bool(e.get("hedged"))).lower())))
+            self._observe("agent_model_attempt_seconds", a + model, e["duration_s"])
+            window["model_attempts"] += 1
+        elif e["event"] == "tool_call":
+            self._inc("agent_tool_calls_total", a + (("tool", e["tool"]), ("status", status)))
+            self._observe("agent_tool_seconds", a + (("tool", e["tool"]),), e["duration_s"])
+            window["tool_calls"] += 1
+            window["tool_failures"] += status == "failure"
+            window["tool_seconds"] += e["duration_s"]
+        elif e["event"] == "subprocess":
+            command = (("command", e["command"]),)
+            self._observe("agent_subprocess_spawn_seconds", a + command, e["spawn_s"])
+            self._inc("agent_subprocess_exits_total", a + command + (("code", e["exit_code"]),))
+        elif e["event"] == "queue_wait":
+            self._observe("agent_queue_wait_seconds", a, e["duration_s"])
+            window["queue_wait_seconds"] += e["duration_s"]
+        elif e["event"] == "snapshot":
+            self._observe("agent_snapshot_seconds", a, e["duration_s"])
+            self._inc("agent_snapshot_files_total", a + (("mode", "linked"),), e["linked"])
+            self._inc("agent_snapshot_files_total", a + (("mode", "copied"),), e["copied"])
+            window["snapshot_seconds"] += e["duration_s"]
+
+    def start_window(self):
+        """Start a new measurement window (one per cycle)."""
+        with self._lock:
+            self._window.clear()
+
+    def window_summary(self, agent):
+        with self._lock:
+            summary = dict(self._window.get(agent, {}))
+        for field in ("turns", "turn_failures", "model_calls", "model_failures", "tool_calls", "tool_failures"):
+            summary[field] = int(summary.get(field, 0))
+        summary["model_latency_avg_s"] = summary.get("model_seconds", 0.0) / summary["model_calls"] if summary["model_calls"] else None
+        summary["model_latency_p95_s"] = self.percentile(agent, "model", 0.95)
+        return summary
+
+    def percentile(self, agent, kind, q):
+        """q-quantile of the agent's recent `kind` latencies (e.g. "model"), or None without samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get((agent, kind), ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def prometheus_text(self):
+        """Snapshot of every counter and histogram in Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            series = counters if kind == "counter" else histograms
+            keys = sorted(k for k in series if k[0] == name)
+            if not keys:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key in keys:
+                labels = key[1]
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {counters[key]:g}")
+                    continue
+                buckets, total, count = histograms[key]
+                for bound, bucket_count in zip(BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {bucket_count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w") as f:
+            f.write(self.prometheus_text())
+
+    def close(self):
+        if self._trace:
+            self._trace.close()
+            self._trace = None
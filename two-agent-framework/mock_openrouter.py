@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Local OpenAI-compatible endpoint that enforces OpenRouter-style rate limits.
+
+Point the `openai` backend at it to exercise the rate-limit scheduler offline:
+
+    python mock_openrouter.py --port 8765 --limit 5 --window 10
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 AGENT_BACKEND=openai python main.py
+
+Each (API key, model) pair may make `limit` requests per fixed `window`.
+Replies stream like /chat/completions and carry X-RateLimit-Limit,
+X-RateLimit-Remaining and X-RateLimit-Reset (epoch ms) headers. Requests over
+the limit get a 429 with Retry-After. The server logs one line per request
+to stderr, and a summary on Ctrl-C.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(limit, window, delay):
+    lock = threading.Lock()
+    windows = defaultdict(lambda: [0.0, 0]) # (key, model) -> [window start, requests]
+    stats = defaultdict(int)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _admit(self, key, model):
+            now = time.time()
+            with lock:
+                start, count = windows[(key, model)]
+                if now - start >= window:
+                    start, count = now, 0
+                admitted = count < limit
+                if admitted:
+                    count += 1
+                windows[(key, model)] = [start, count]
+            return admitted, limit - count, start + window
+
+        def _send_json(self, status, payload, headers):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            key = self.headers.get("Authorization", "")
+            model = body.get("model", "")
+            admitted, remaining, reset = self._admit(key, model)
+            headers = {
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(max(remaining, 0)),
+                "X-RateLimit-Reset": str(int(reset * 1000)),
+            }
+            with lock:
+                stats["ok" if admitted else "429"] += 1
+            print(f"{time.strftime('%H:%M:%S')} {model} {'200' if admitted else '429'} remaining={max(remaining, 0)}", file=sys.stderr)
+
+            if not admitted:
+                headers["Retry-After"] = str(max(int(reset - time.time() + 0.999), 1))
+                self._send_json(429, {"error": {"message": "Rate limit exceeded", "code": 429}}, headers)
+                return
+
+            time.sleep(delay)
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def chunk(data):
+                payload = data.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                self.wfile.flush()
+
+            reply = f"Mock reply from {model} to a {len(body.get('messages', []))}-message conversation."
+            for word in reply.split(" "):
+                chunk("data: " + json.dumps({
+                    "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+                }) + "\n\n")
+            chunk("data: [DONE]\n\n")
+            chunk("")
+
+    return Handler, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate-limited mock of the OpenRouter chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--limit", type=int, default=20, help="Requests per window for each key and model")
+    parser.add_argument("--window", type=float, default=60.0, help="Window length in seconds")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before each reply starts")
+    args = parser.parse_args(argv)
+
+    handler, stats = make_handler(args.limit, args.window, args.delay)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Mock OpenRouter on http://{args.host}:{args.port}/v1 ({args.limit} requests / {args.window:g}s per key and model)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {stats['ok']} requests, rejected {stats['429']} with 429", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
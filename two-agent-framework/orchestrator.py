@@ -0,0 +1,122 @@
+import asyncio
+
+DEFAULT_TOPOLOGY = "alpha>beta,beta>alpha,alpha>beta,beta>alpha"
+
+
+class Mailbox:
+    """An agent inbox backed by asyncio.Queue.
+
+    Turns run in worker threads, so `put` hands items to the event loop with
+    call_soon_threadsafe. Receivers await `get` instead of polling with a timeout.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.loop = None
+
+    def bind(self, loop):
+        # Created here so the queue belongs to the loop that will await it
+        self.queue = asyncio.Queue()
+        self.loop = loop
+
+    def put(self, item):
+        # Same call Agent.send_message already makes on a queue.Queue
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def get_nowait(self):
+        return self.queue.get_nowait()
+
+    def empty(self):
+        return self.queue.empty()
+
+
+def parse_topology(spec, agents):
+    """Turn "alpha>beta,beta>alpha" into [(speaker, recipient), ...] using the agents mapping."""
+    steps = []
+    for hop in spec.split(","):
+        speaker, _, recipient = hop.strip().partition(">")
+        if speaker not in agents or recipient not in agents:
+            raise ValueError(f"Unknown agent in topology step: {hop.strip()!r}")
+        steps.append((agents[speaker], agents[recipient]))
+    return steps
+
+
+class Orchestrator:
+    """Event-driven scheduler for the agent conversation.
+
+    Each cycle runs the turns in `topology`. Every agent works through its own
+    steps in a separate task: it awaits its next message, then runs the
+    blocking turn in a worker thread, so one agent's tool execution never
+    blocks the event loop or the other agent. With overlap_tools, an agent
+    forwards its reply before running the tool, so the recipient starts
+    reasoning while the tool runs. Both agents reflect concurrently at the
+    end of each cycle.
+    """
+
+    def __init__(self, agents, topology=DEFAULT_TOPOLOGY, cycles=1, overlap_tools=False, receive_timeout=None, assess=None):
+        self.agents = agents # name -> Agent
+        self.topology = parse_topology(topology, agents) if isinstance(topology, str) else topology
+        self.cycles = cycles
+        self._check_topology()
+        self.receive_timeout = receive_timeout
+        self.assess = assess # callable(agents) -> task_success; defaults to True
+        for agent in agents.values():
+            agent.overlap_tools = overlap_tools
+
+    def _check_topology(self):
+        # Every turn sends exactly one message to its recipient, so each hop must
+        # start where the previous one ended or the speaker would wait forever
+        for (_, recipient), (speaker, _) in zip(self.topology, self.topology[1:]):
+            if speaker is not recipient:
+                raise ValueError(f"Topology is not a chain: {recipient.name} replies next, not {speaker.name}")
+        if self.cycles > 1 and self.topology[-1][1] is not self.topology[0][0]:
+            raise ValueError("Topology must end with a message to its first speaker to run more than one cycle")
+
+    async def _run_agent_steps(self, agent, steps, first_message):
+        for index, recipient in steps:
+            if index == 0 and first_message is not None:
+                msg = first_message
+            else:
+                sender, msg = await agent.areceive_message(timeout=self.receive_timeout)
+                if not msg: # Timed out waiting for the other agent
+                    return
+            await asyncio.to_thread(agent.run_turn, recipient, msg)
+
+    async def run_cycle(self, first_message=None):
+        # Group the cycle's steps by speaker, keeping their order
+        steps_by_agent = {}
+        for index, (speaker, recipient) in enumerate(self.topology):
+            steps_by_agent.setdefault(speaker, []).append((index, recipient))
+
+        tasks = [
+            asyncio.ensure_future(self._run_agent_steps(agent, steps, first_message))
+            for agent, steps in steps_by_agent.items()
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result() # Re-raise a failed turn
+
+    async def run(self, initial_message):
+        loop = asyncio.get_running_loop()
+        for agent in self.agents.values():
+            agent.comm_queue.bind(loop)
+
+        for cycle in range(self.cycles):
+            print(f"\n=== Cycle {cycle + 1} ===")
+            for metrics in {id(a.metrics): a.metrics for a in self.agents.values()}.values():
+                metrics.start_window() # Assessment and reflection see this cycle's numbers only
+
+            # Only the first cycle is seeded; later ones continue from pending messages
+            await self.run_cycle(initial_message if cycle == 0 else None)
+
+            # Performance assessment for self-improvement
+            task_success = self.assess(self.agents) if self.assess else True
+            await asyncio.gather(*(
+                asyncio.to_thread(agent.reflect_and_improve, task_success)
+                for agent in self.agents.values()
+            ))
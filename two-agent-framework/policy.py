@@ -0,0 +1,200 @@
+import os
+import time
+import queue
+import random
+import threading
+from collections import defaultdict, deque
+
+
+class RequestPolicy:
+    """How an agent's prompts are sent: fallback models, adaptive timeouts, retries and hedging.
+
+    `models` is tried in order. Each model gets `retries` extra attempts with
+    full-jitter exponential backoff before the next one is used. Once a model
+    has min_samples successful replies, its timeout is timeout_multiplier x its
+    p95 latency, clamped to [min_timeout, timeout].
+
+    With hedge_after set (seconds, or "auto" for the primary's p90 latency), a
+    prompt still unanswered after that delay is also sent to the next model,
+    and the first answer wins. Hedging needs a backend with `complete()`
+    (the stateless openai backend). The OpenCode worker keeps one server-side
+    conversation, so it never runs two prompts at once.
+
+    With a RateLimiter, every attempt first waits for a token in its API key's
+    and model's buckets, and the response (429s, Retry-After, rate-limit
+    headers) is fed back into them. Models that are currently throttled are
+    tried after those with capacity, and a rate-limited model is not retried
+    until its bucket reopens.
+
+    A streamed reply cannot be taken back. An attempt that fails after
+    streaming text is not retried, and in a hedge the first model to stream
+    is the one that is kept. For the same reason, a timed-out prompt on the
+    OpenCode worker is only retried once the worker has aborted it; a result
+    with `in_flight` set ends the run.
+    """
+
+    def __init__(self, models, retries=1, backoff=1.0, max_backoff=30.0, timeout=120, min_timeout=15,
+                 timeout_multiplier=3.0, min_samples=5, hedge_after=None, observer=None, limiter=None, api_key=None):
+        self.models = list(models)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.hedge_after = hedge_after
+        self.observer = observer # callable(model=, duration_s=, status=, hedged=) per attempt
+        self.limiter = limiter
+        self.api_key = api_key
+        self._latencies = defaultdict(lambda: deque(maxlen=200)) # model -> recent successful latencies
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, models, **kwargs):
+        """Settings from AGENT_RETRIES, AGENT_TIMEOUT and AGENT_HEDGE_AFTER ("auto" or seconds; unset disables)."""
+        hedge_after = os.getenv("AGENT_HEDGE_AFTER") or None
+        if hedge_after not in (None, "auto"):
+            hedge_after = float(hedge_after)
+        kwargs.setdefault("retries", int(os.getenv("AGENT_RETRIES", "1")))
+        kwargs.setdefault("timeout", float(os.getenv("AGENT_TIMEOUT", "120")))
+        kwargs.setdefault("hedge_after", hedge_after)
+        return cls(models, **kwargs)
+
+    def percentile(self, model, q):
+        with self._lock:
+            samples = sorted(self._latencies[model])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, model):
+        p95 = self.percentile(model, 0.95)
+        if p95 is None:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+
+    def hedge_delay(self, model):
+        if self.hedge_after == "auto":
+            return self.percentile(model, 0.9) # No hedging until there is data
+        return self.hedge_after
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _attempt(self, call, model, prompt, session_id, on_chunk, hedged=False, **kwargs):
+        if self.limiter is not None and not self.limiter.acquire(self.api_key, model, timeout=self.timeout):
+            result = {
+                'success': False,
+                'error': f"Rate limited: no request capacity for {model} within {self.timeout:.0f}s",
+                'rate_limited': True,
+                'model_used': model
+            }
+            if self.observer:
+                self.observer(model=model, duration_s=0.0, status="rate_limited", hedged=hedged)
+            return result
+
+        started = time.perf_counter()
+        result = call(prompt, session_id=session_id, on_chunk=on_chunk, model=model, timeout=self.timeout_for(model), **kwargs)
+        duration = time.perf_counter() - started
+        if self.limiter is not None:
+            self.limiter.feedback(self.api_key, model, status=429 if result.get('rate_limited') else None,
+                                  headers=result.get('headers'), retry_after=result.get('retry_after'))
+        if result['success']:
+            with self._lock:
+                self._latencies[model].append(duration)
+        if self.observer:
+            status = ("success" if result['success'] else "cancelled" if result.get('cancelled')
+                      else "rate_limited" if result.get('rate_limited') else "failure")
+            self.observer(model=model, duration_s=duration, status=status, hedged=hedged)
+        return result
+
+    def _ordered_models(self):
+        # Models with capacity right now first; otherwise keep the configured order
+        if self.limiter is None or len(self.models) == 1:
+            return self.models
+        waits = {model: self.limiter.wait_time(self.api_key, model) for model in self.models}
+        return sorted(self.models, key=lambda model: waits[model] > 0)
+
+    def run(self, backend, prompt, session_id=None, on_chunk=None):
+        """Send prompt through backend under this policy; returns the usual result dict."""
+        streamed = [False]
+
+        def tracked_chunk(text):
+            streamed[0] = True
+            on_chunk(text)
+
+        models = self._ordered_models()
+        result = None
+        for index, model in enumerate(models):
+            hedge_model = models[index + 1] if index + 1 < len(models) else None
+            delay = self.hedge_delay(model) if hedge_model and hasattr(backend, "complete") else None
+            for attempt in range(self.retries + 1):
+                if delay is not None:
+                    result = self._race(backend, (model, hedge_model), delay, prompt, session_id, tracked_chunk if on_chunk else None)
+                else:
+                    result = self._attempt(backend.run_prompt, model, prompt, session_id, tracked_chunk if on_chunk else None)
+                if result['success'] or streamed[0] or result.get('in_flight'):
+                    return result # Still being answered server-side: another prompt would collide with it
+                if result.get('rate_limited'):
+                    break # Its bucket is paused; try the next model instead of waiting
+                if attempt < self.retries:
+                    time.sleep(self.backoff_delay(attempt))
+
+        if result.get('rate_limited') and self.limiter is not None:
+            # Every model is throttled: queue for whichever reopens first
+            model = min(models, key=lambda m: self.limiter.wait_time(self.api_key, m))
+            result = self._attempt(backend.run_prompt, model, prompt, session_id, tracked_chunk if on_chunk else None)
+        return result
+
+    def _race(self, backend, models, delay, prompt, session_id, on_chunk):
+        """Start models[0]; after `delay` (or as soon as it fails) also start models[1]. First answer wins."""
+        results = queue.Queue()
+        cancelled = threading.Event()
+        owner = [] # Model whose stream reached on_chunk first
+        owner_lock = threading.Lock()
+
+        def chunk_for(model):
+            def forward(text):
+                with owner_lock:
+                    if not owner:
+                        owner.append(model)
+                if owner[0] == model:
+                    on_chunk(text)
+            return forward if on_chunk else None
+
+        def launch(model, hedged):
+            threading.Thread(
+                target=lambda: results.put((model, self._attempt(
+                    backend.complete, model, prompt, session_id, chunk_for(model), hedged=hedged, cancelled=cancelled))),
+                daemon=True # A cancelled loser may still be finishing its request
+            ).start()
+
+        launch(models[0], False)
+        launched, pending, deadline = 1, 1, time.monotonic() + delay
+        last_failure = None
+        while pending:
+            wait = max(deadline - time.monotonic(), 0) if launched < len(models) else None
+            try:
+                model, result = results.get(timeout=wait)
+            except queue.Empty:
+                launch(models[launched], True)
+                launched += 1
+                pending += 1
+                continue
+            pending -= 1
+            streaming_winner = owner and owner[0] == model
+            if result['success'] and (not owner or streaming_winner):
+                cancelled.set()
+                backend.remember(prompt, result['output'], session_id=session_id) # Only the winner enters history
+                return result
+            if streaming_winner:
+                cancelled.set()
+                return result # Its partial reply has already been streamed
+            if not result['success']:
+                last_failure = result
+            if launched < len(models): # Failed before the deadline: hedge right away
+                launch(models[launched], True)
+                launched += 1
+                pending += 1
+        return last_failure
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: buckets are still shared between threads, not processes
+    fcntl = None
+
+DEFAULT_PENALTY = 20.0 # Seconds to back off after a 429 that says nothing about when to retry
+_RATE_LIMIT_TEXT_RE = re.compile(r"\b429\b|rate[ -]?limit|too many requests", re.IGNORECASE)
+_RETRY_AFTER_TEXT_RE = re.compile(r"retry[ -]?after\D{0,5}(\d+(?:\.\d+)?)\s*(ms|s)?", re.IGNORECASE)
+
+
+def key_fingerprint(api_key):
+    # Bucket files are named after a hash, never the key itself
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+def is_rate_limited(text):
+    """Whether an error message (e.g. from the OpenCode CLI) reports a provider rate limit."""
+    return bool(text) and bool(_RATE_LIMIT_TEXT_RE.search(text))
+
+
+def retry_after_from_text(text):
+    match = _RETRY_AFTER_TEXT_RE.search(text or "")
+    if not match:
+        return None
+    value = float(match.group(1))
+    return value / 1000 if (match.group(2) or "").lower() == "ms" else value
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date)."""
+    if value is None:
+        return None
+    now = time.time() if now is None else now
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime # Rare (HTTP-date form); keep it off the import path
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - now, 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_time(value, now):
+    # X-RateLimit-Reset is an epoch in ms (OpenRouter) or s, or seconds from now
+    reset = float(value)
+    if reset > 1e11:
+        return reset / 1000
+    if reset > 1e9:
+        return reset
+    return now + reset
+
+
+class RateLimiter:
+    """Token buckets per API key and per (API key, model), shared across threads and processes.
+
+    Bucket state lives in small JSON files under state_dir, guarded by flock,
+    so parallel batch missions using the same key draw from one budget.
+    key_rpm and model_rpm (requests per minute, None for no fixed limit) set the
+    refill rate; burst is the bucket size. Provider feedback tightens the
+    buckets further. A 429, a Retry-After header or X-RateLimit-Remaining: 0
+    pauses the bucket until the provider says it has capacity again.
+    """
+
+    def __init__(self, state_dir=None, key_rpm=None, model_rpm=None, burst=5):
+        self.state_dir = Path(state_dir or Path(tempfile.gettempdir()) / "agent-ratelimit")
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.key_rpm = key_rpm
+        self.model_rpm = model_rpm
+        self.burst = burst
+        self._thread_lock = threading.Lock() # Without fcntl this is the only guard
+
+    @classmethod
+    def from_env(cls):
+        """Limits from AGENT_RATE_LIMIT_RPM (per key), AGENT_MODEL_RATE_LIMIT_RPM (per key and model), AGENT_RATE_BURST and AGENT_RATE_DIR."""
+        key_rpm = float(os.getenv("AGENT_RATE_LIMIT_RPM", "0")) or None
+        model_rpm = float(os.getenv("AGENT_MODEL_RATE_LIMIT_RPM", "0")) or None
+        return cls(os.getenv("AGENT_RATE_DIR"), key_rpm=key_rpm, model_rpm=model_rpm,
+                   burst=int(os.getenv("AGENT_RATE_BURST", "5")))
+
+    def _bucket_path(self, api_key, model=None):
+        name = key_fingerprint(api_key) + ("-" + hashlib.sha256(model.encode()).hexdigest()[:12] if model else "")
+        return self.state_dir / f"{name}.json"
+
+    @contextmanager
+    def _bucket(self, path):
+        # Read-modify-write one bucket file under an exclusive flock
+        with open(path, "a+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except json.JSONDecodeError:
+                state = {}
+            yield state
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+
+    def _refill(self, state, rpm, now):
+        if rpm is None:
+            state["tokens"] = self.burst
+        else:
+            elapsed = max(now - state.get("updated", now), 0.0)
+            state["tokens"] = min(self.burst, state.get("tokens", self.burst) + elapsed * rpm / 60)
+        state["updated"] = now
+
+    def _wait(self, state, rpm, now):
+        blocked = max(state.get("blocked_until", 0) - now, 0.0)
+        if state["tokens"] >= 1:
+            return blocked
+        return max(blocked, (1 - state["tokens"]) * 60 / rpm)
+
+    def reserve(self, api_key, model):
+        """Take a token from both buckets if both have one now. Returns 0, or the seconds until they will."""
+        now = time.time()
+        # Always key bucket first, then model bucket, so concurrent reservations cannot deadlock
+        with self._thread_lock, self._bucket(self._bucket_path(api_key)) as key_state, \
+                self._bucket(self._bucket_path(api_key, model)) as model_state:
+            self._refill(key_state, self.key_rpm, now)
+            self._refill(model_state, self.model_rpm, now)
+            wait = max(self._wait(key_state, self.key_rpm, now), self._wait(model_state, self.model_rpm, now))
+            if wait == 0:
+                key_state["tokens"] -= 1
+                model_state["tokens"] -= 1
+            return wait
+
+    def wait_time(self, api_key, model):
+        """Seconds until a request for this key and model could start, without reserving anything."""
+        now = time.time()
+        waits = []
+        for path, rpm in ((self._bucket_path(api_key), self.key_rpm), (self._bucket_path(api_key, model), self.model_rpm)):
+            with self._thread_lock, self._bucket(path) as state:
+                self._refill(state, rpm, now)
+                waits.append(self._wait(state, rpm, now))
+        return max(waits)
+
+    def acquire(self, api_key, model, timeout=None):
+        """Block until a request may be sent and reserve it. False if timeout would pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve(api_key, model)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0)) # Re-check: other processes may have taken or returned capacity
+
+    def feedback(self, api_key, model, status=None, headers=None, retry_after=None):
+        """Apply a provider response: HTTP status, rate-limit headers, or a Retry-After parsed from an error.
+
+        Returns the seconds the bucket is now paused for (0 if it is not).
+        """
+        now = time.time()
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        pause_until = 0.0
+
+        if retry_after is None:
+            retry_after = parse_retry_after(headers.get("retry-after"), now)
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        try:
+            if remaining is not None and float(remaining) <= 0 and reset is not None:
+                pause_until = _reset_time(reset, now)
+        except ValueError:
+            pass
+        if retry_after is not None:
+            pause_until = max(pause_until, now + retry_after)
+        elif status == 429 and not pause_until:
+            pause_until = now + DEFAULT_PENALTY
+
+        if pause_until > now:
+            with self._thread_lock, self._bucket(self._bucket_path(api_key, model)) as state:
+                state["blocked_until"] = max(state.get("blocked_until", 0), pause_until)
+        return max(pause_until - now, 0.0)
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import socket
+import atexit
+import subprocess
+import urllib.error
+
+
+class OpenCodeSession:
+    """A long-lived OpenCode worker owned by a single agent.
+
+    Starts `opencode serve` once, creates one server-side session and posts
+    every prompt to it over HTTP. The CLI is not respawned per turn and the
+    conversation is kept by the server instead of being replayed.
+    """
+
+    def __init__(self, model, api_key=None, cwd=None, host="127.0.0.1", port=None, startup_timeout=30):
+        self.model = model
+        self.api_key = api_key
+        self.cwd = cwd
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.session_id = None
+        self._failed = False # Set once `opencode serve` could not be started
+        atexit.register(self.close)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def _free_port(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind((self.host, 0))
+            return s.getsockname()[1]
+
+    def _wait_until_listening(self):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                return False # Server exited during startup
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.5):
+                    return True
+            except OSError:
+                time.sleep(0.1)
+        return False
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the warm server if needed. Returns False if it is unavailable."""
+        if self.is_alive():
+            return True
+        if self._failed:
+            return False
+
+        env = os.environ.copy()
+        if self.api_key:
+            env['OPENROUTER_API_KEY'] = self.api_key
+        if self.port is None:
+            self.port = self._free_port()
+
+        try:
+            self.process = subprocess.Popen(
+                ['opencode', 'serve', '--hostname', self.host, '--port', str(self.port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                cwd=str(self.cwd) if self.cwd else None,
+                start_new_session=True # Keep Ctrl-C in the terminal from killing the worker mid-turn
+            )
+        except (FileNotFoundError, OSError):
+            self._failed = True
+            return False
+
+        if not self._wait_until_listening():
+            self.close()
+            self._failed = True
+            return False
+        return True
+
+    def _request(self, method, path, payload=None, timeout=120):
+        import urllib.request # Pulls in ssl and http.client; only needed once a prompt is sent
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+        return json.loads(body) if body else None
+
+    def ensure_session(self):
+        """Create the server-side session on first use and reuse it afterwards."""
+        if self.session_id is None:
+            session = self._request('POST', '/session', {})
+            self.session_id = session['id']
+        return self.session_id
+
+    def run_prompt(self, prompt, timeout=120, model=None):
+        """Send one prompt to the persistent session; same result shape as `Agent._run_shell_command`.
+
+        `model` overrides the worker's model for this prompt only (fallbacks share the session).
+        """
+        model = model or self.model
+        if not self.start():
+            return {
+                'success': False,
+                'error': 'OpenCode worker is not running',
+                'model_used': model
+            }
+
+        provider_id, _, model_id = f"openrouter/{model}".partition('/')
+        try:
+            session_id = self.ensure_session()
+            # Older servers read the top-level ids, newer ones the nested `model`
+            reply = self._request('POST', f'/session/{session_id}/message', {
+                'providerID': provider_id,
+                'modelID': model_id,
+                'model': {'providerID': provider_id, 'modelID': model_id},
+                'parts': [{'type': 'text', 'text': prompt}]
+            }, timeout=timeout)
+        except socket.timeout:
+            # The server is still working on the prompt. Stop it, or a retry would land in a busy session
+            aborted = self.abort()
+            return {
+                'success': False,
+                'error': 'Command execution timed out' + ('' if aborted else '; the worker could not be stopped'),
+                'in_flight': not aborted,
+                'model_used': model
+            }
+        except urllib.error.HTTPError as e:
+            return {
+                'success': False,
+                'error': f"OpenCode worker returned HTTP {e.code}: {e.read().decode(errors='replace')}",
+                'rate_limited': e.code == 429,
+                'headers': dict(e.headers),
+                'model_used': model
+            }
+        except (urllib.error.URLError, ConnectionError, ValueError, KeyError) as e:
+            return {
+                'success': False,
+                'error': f"OpenCode worker request failed: {e}",
+                'model_used': model
+            }
+
+        parts = (reply or {}).get('parts', [])
+        output = ''.join(p.get('text', '') for p in parts if p.get('type') == 'text')
+        error = ((reply or {}).get('info') or {}).get('error')
+        return {
+            'success': not error,
+            'output': output,
+            'error': json.dumps(error) if error else '',
+            'model_used': model,
+            'session_id': session_id
+        }
+
+    def abort(self, timeout=10):
+        """Abort whatever the session is generating. Returns False if the server did not confirm it."""
+        if self.session_id is None:
+            return True
+        try:
+            self._request('POST', f'/session/{self.session_id}/abort', {}, timeout=timeout)
+            return True
+        except (urllib.error.URLError, ConnectionError, OSError, ValueError):
+            return False
+
+    def close(self):
+        """Stop the worker process. The server-side session id is kept for cold `--session` fallbacks."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
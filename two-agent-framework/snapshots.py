@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import shutil
+import fnmatch
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: no reflinks, plain copies
+    fcntl = None
+
+FICLONE = 0x40049409 # Linux ioctl: share a file's blocks copy-on-write (btrfs, XFS, bcachefs)
+DEFAULT_EXCLUDE = (".blobs", "agent_state.db*") # Top-level names never snapshotted or restored
+
+
+class SnapshotStore:
+    """Incremental, hardlink-based snapshots of an agent workspace.
+
+    Each snapshot is a full tree under <root>/<id>/tree plus a manifest, but a
+    file unchanged since the previous snapshot (same size, mtime, ctime, inode
+    and mode) is a hardlink to that snapshot's copy, so taking one costs a stat per file and
+    a copy per changed file. Snapshot files are never linked into the live
+    workspace, so in-place writes there (e.g. `>>` in a bash command) cannot
+    reach them. Copies use reflinks where the filesystem supports them.
+
+    restore() rewrites only the files that differ from the snapshot and
+    removes the ones it does not have; fork() copies a snapshot into a new
+    directory so an alternative turn can run there in parallel. Only the
+    `keep` newest snapshots are kept. Every operation holds an flock on
+    <root>/.lock, so separate stores and processes on one workspace take
+    turns instead of racing for snapshot ids and the staging directory.
+
+    The store defaults to a sibling of the workspace, <workspace>.snapshots,
+    so commands run in the sandbox (grep -r, find, tar, git add -A) never see
+    the copies. It must be on the same filesystem for hardlinks to work.
+    """
+
+    def __init__(self, workspace_dir, root=None, keep=50, exclude=DEFAULT_EXCLUDE):
+        self.workspace_dir = Path(workspace_dir).resolve()
+        self.root = Path(root).resolve() if root else self.workspace_dir.with_name(self.workspace_dir.name + ".snapshots")
+        self.keep = keep
+        self.exclude = tuple(exclude)
+        if self.workspace_dir in self.root.parents:
+            self.exclude += (self.root.relative_to(self.workspace_dir).parts[0],) # Never snapshot the store itself
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock() # Without fcntl this is the only guard
+        self._reflink = fcntl is not None and hasattr(fcntl, "ioctl")
+
+    @classmethod
+    def from_env(cls, workspace_dir):
+        """Build the store from AGENT_SNAPSHOTS (0 disables) and AGENT_SNAPSHOT_KEEP; returns None when off."""
+        if os.getenv("AGENT_SNAPSHOTS", "1").lower() in ("0", "false", "no", "off"):
+            return None
+        return cls(workspace_dir, keep=int(os.getenv("AGENT_SNAPSHOT_KEEP", "50")))
+
+    # Workspace scanning
+
+    def _excluded(self, rel):
+        top = rel.split("/", 1)[0]
+        return any(fnmatch.fnmatch(top, pattern) for pattern in self.exclude)
+
+    def _scan(self, directory=None, prefix=""):
+        """Yield (relpath, kind, stat, link target) for the tree, parents before children; kind is d, f or l."""
+        directory = directory or self.workspace_dir
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except FileNotFoundError: # Removed by a tool running in parallel
+            return
+        for entry in entries:
+            rel = prefix + entry.name
+            if not prefix and self._excluded(rel):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            if entry.is_symlink():
+                yield rel, "l", st, os.readlink(entry.path)
+            elif entry.is_dir(follow_symlinks=False):
+                yield rel, "d", st, None
+                yield from self._scan(entry.path, rel + "/")
+            elif entry.is_file(follow_symlinks=False):
+                yield rel, "f", st, None
+            # Sockets, FIFOs and devices are skipped
+
+    @staticmethod
+    def _signature(st):
+        # ctime too: an in-place rewrite that restores size and mtime (cp -p, touch -r) cannot reset it
+        return [st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_mode]
+
+    @contextmanager
+    def _locked(self):
+        # Threads of this store share _lock; other stores and processes share the flock
+        with self._lock, open(self.root / ".lock", "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    # Store layout
+
+    def _tree(self, snapshot_id):
+        return self.root / snapshot_id / "tree"
+
+    def _read_json(self, path, default=None):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return default
+
+    def _write_json(self, path, data):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _head(self):
+        # The snapshot the workspace was last captured as or restored to, with the file signatures it had then
+        head = self._read_json(self.root / "HEAD", {})
+        if head.get("id") and not (self.root / head["id"]).is_dir():
+            return {}
+        return head
+
+    def _ids(self):
+        return sorted(path.name for path in self.root.iterdir() if path.name.isdigit() and path.is_dir())
+
+    def manifest(self, snapshot_id):
+        snapshot_id = str(snapshot_id)
+        manifest = self._read_json(self.root / snapshot_id / "manifest.json") if snapshot_id.isdigit() else None
+        if manifest is None:
+            raise ValueError(f"No such snapshot: {snapshot_id}")
+        return manifest
+
+    def list(self):
+        """Snapshots oldest first, as {"id", "label", "ts", "files"} dicts."""
+        snapshots = []
+        for snapshot_id in self._ids():
+            manifest = self._read_json(self.root / snapshot_id / "manifest.json")
+            if manifest:
+                snapshots.append({
+                    "id": manifest["id"], "label": manifest["label"], "ts": manifest["ts"],
+                    "files": sum(1 for entry in manifest["entries"].values() if entry[0] == "f")
+                })
+        return snapshots
+
+    def _copy(self, src, dst):
+        """Copy a file with its metadata, as a reflink when the filesystem can."""
+        if self._reflink:
+            try:
+                with open(src, "rb") as s, open(dst, "wb") as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                shutil.copystat(src, dst)
+                return
+            except OSError:
+                self._reflink = False # ext4, tmpfs, cross-device...: stop trying for this store
+        shutil.copy2(src, dst)
+
+    @staticmethod
+    def _link(src, dst):
+        try:
+            os.link(src, dst)
+            return True
+        except OSError: # Pruned meanwhile, or too many links
+            return False
+
+    # Operations
+
+    def snapshot(self, label=""):
+        """Capture the workspace. Returns {"id", "files", "linked", "copied"}."""
+        with self._locked():
+            head = self._head()
+            base = self._tree(head["id"]) if head else None
+            base_files = head.get("files", {})
+            existing = self._ids()
+            snapshot_id = f"{int(existing[-1]) + 1 if existing else 1:06d}"
+            staging = self.root / f".{snapshot_id}.tmp"
+            if staging.exists():
+                shutil.rmtree(staging)
+            tree = staging / "tree"
+            tree.mkdir(parents=True)
+
+            entries, files = {}, {}
+            linked = copied = 0
+            for rel, kind, st, target in self._scan():
+                dst = tree / rel
+                if kind == "d":
+                    dst.mkdir()
+                    entries[rel] = ["d"]
+                    continue
+                if kind == "l":
+                    os.symlink(target, dst)
+                    entries[rel] = ["l", target]
+                    continue
+                signature = self._signature(st)
+                if base is not None and base_files.get(rel) == signature and self._link(base / rel, dst):
+                    linked += 1 # Unchanged since the last snapshot: share its copy
+                else:
+                    try:
+                        self._copy(self.workspace_dir / rel, dst)
+                    except FileNotFoundError:
+                        continue # Deleted while scanning
+                    copied += 1
+                entries[rel] = ["f"]
+                files[rel] = signature
+
+            self._write_json(staging / "manifest.json", {"id": snapshot_id, "label": label, "ts": time.time(), "entries": entries})
+            os.replace(staging, self.root / snapshot_id)
+            self._write_json(self.root / "HEAD", {"id": snapshot_id, "files": files})
+            self._prune(keep_id=snapshot_id)
+            return {"id": snapshot_id, "files": len(files), "linked": linked, "copied": copied}
+
+    def restore(self, snapshot_id):
+        """Make the workspace match a snapshot, rewriting only what differs. Returns {"id", "restored", "removed"}."""
+        with self._locked():
+            entries = self.manifest(snapshot_id)["entries"]
+            tree = self._tree(snapshot_id)
+            head = self._head()
+            head_tree = self._tree(head["id"]) if head else None
+            head_files = head.get("files", {})
+            current = {rel: (kind, st, target) for rel, kind, st, target in self._scan()}
+
+            removed = 0
+            for rel in sorted(set(current) - set(entries), reverse=True): # Children before their directories
+                self._remove(self.workspace_dir / rel, current[rel][0])
+                removed += 1
+
+            files, restored = {}, 0
+            for rel, entry in entries.items(): # Manifest order: parents before children
+                dst = self.workspace_dir / rel
+                kind, st, target = current.get(rel, (None, None, None))
+                if entry[0] == "d":
+                    if kind != "d":
+                        self._remove(dst, kind)
+                        dst.mkdir()
+                    continue
+                if entry[0] == "l":
+                    if kind != "l" or target != entry[1]:
+                        self._remove(dst, kind)
+                        os.symlink(entry[1], dst)
+                        restored += 1
+                    continue
+                if kind == "f" and self._unchanged(rel, st, head_tree, head_files, tree):
+                    files[rel] = self._signature(st)
+                    continue
+                if kind != "f":
+                    self._remove(dst, kind)
+                tmp = dst.with_name(f".{dst.name}.restore")
+                self._copy(tree / rel, tmp)
+                os.replace(tmp, dst)
+                files[rel] = self._signature(os.stat(dst))
+                restored += 1
+
+            self._write_json(self.root / "HEAD", {"id": snapshot_id, "files": files})
+            return {"id": snapshot_id, "restored": restored, "removed": removed}
+
+    def _unchanged(self, rel, st, head_tree, head_files, tree):
+        # The workspace file is still what HEAD captured, and HEAD's copy is the snapshot's copy (one hardlinked file)
+        if head_tree is None or head_files.get(rel) != self._signature(st):
+            return False
+        try:
+            return os.stat(head_tree / rel).st_ino == os.stat(tree / rel).st_ino
+        except OSError:
+            return False
+
+    @staticmethod
+    def _remove(path, kind):
+        if kind == "d":
+            shutil.rmtree(path)
+        elif kind is not None:
+            os.unlink(path)
+
+    def fork(self, snapshot_id, dest_dir):
+        """Copy a snapshot into dest_dir (new or empty) as an independent sandbox. Returns its path."""
+        with self._locked():
+            entries = self.manifest(snapshot_id)["entries"]
+            tree = self._tree(snapshot_id)
+            dest = Path(dest_dir).resolve()
+            dest.mkdir(parents=True, exist_ok=True)
+            if any(dest.iterdir()):
+                raise FileExistsError(f"Fork target is not empty: {dest}")
+            for rel, entry in entries.items():
+                if entry[0] == "d":
+                    (dest / rel).mkdir()
+                elif entry[0] == "l":
+                    os.symlink(entry[1], dest / rel)
+                else:
+                    self._copy(tree / rel, dest / rel) # Copied, not linked: the fork is mutated in place
+            return dest
+
+    def _prune(self, keep_id):
+        snapshots = self._ids()
+        for snapshot_id in snapshots[:max(len(snapshots) - self.keep, 0)]:
+            if snapshot_id != keep_id:
+                shutil.rmtree(self.root / snapshot_id, ignore_errors=True) # Later snapshots keep their own links
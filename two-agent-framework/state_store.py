@@ -0,0 +1,214 @@
+import json
+import time
+import sqlite3
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upgrades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    agent TEXT NOT NULL,
+    model TEXT NOT NULL,
+    suggestion TEXT NOT NULL,
+    successful INTEGER NOT NULL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS upgrades_by_agent_model ON upgrades (agent, model, id);
+CREATE TABLE IF NOT EXISTS cycles (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    agent TEXT NOT NULL,
+    model TEXT NOT NULL,
+    task_success INTEGER NOT NULL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS cycles_by_agent_model ON cycles (agent, model, id);
+CREATE TABLE IF NOT EXISTS totals (
+    agent TEXT NOT NULL,
+    model TEXT NOT NULL,
+    upgrades INTEGER NOT NULL DEFAULT 0,
+    successful_upgrades INTEGER NOT NULL DEFAULT 0,
+    cycles INTEGER NOT NULL DEFAULT 0,
+    successful_cycles INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (agent, model)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class StateStore:
+    """Append-only reflection journal in SQLite, shared by every agent in a workspace.
+
+    Upgrades and per-cycle outcomes are appended as rows; running totals per
+    (agent, model) are updated in the same transaction, so the success rate is
+    read without scanning history. WAL mode and BEGIN IMMEDIATE let several
+    agents (or runs) write to one file safely.
+
+    On first use, upgrades from a legacy agent_state.json next to the
+    database are imported once.
+    """
+
+    def __init__(self, path, legacy_json=None, timeout=30):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            self._enable_wal(conn)
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        legacy_json = Path(legacy_json) if legacy_json else self.path.with_suffix(".json")
+        if legacy_json.exists():
+            self.migrate_json(legacy_json)
+
+    def _enable_wal(self, conn):
+        # Persistent: readers never block the writer. Switching needs an exclusive lock
+        # and can fail with "database is locked" while another agent opens the same new
+        # file, without waiting on the busy timeout, so it is retried here
+        deadline = time.monotonic() + self.timeout
+        while conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.OperationalError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _connect(self):
+        # One short-lived connection per operation: safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _write(self, statements):
+        """Run [(sql, params), ...] in one BEGIN IMMEDIATE transaction."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(agent, model, **columns):
+        sets = ", ".join(f"{name} = {name} + excluded.{name}" for name in columns)
+        names = ", ".join(columns)
+        marks = ", ".join("?" for _ in columns)
+        return (
+            f"INSERT INTO totals (agent, model, {names}) VALUES (?, ?, {marks}) "
+            f"ON CONFLICT (agent, model) DO UPDATE SET {sets}",
+            (agent, model, *columns.values())
+        )
+
+    def add_upgrade(self, agent, model, suggestion, successful, metrics=None, ts=None):
+        self._write([
+            ("INSERT INTO upgrades (ts, agent, model, suggestion, successful, metrics) VALUES (?, ?, ?, ?, ?, ?)",
+             (ts or time.time(), agent, model, suggestion, int(bool(successful)), json.dumps(metrics) if metrics is not None else None)),
+            self._bump(agent, model, upgrades=1, successful_upgrades=int(bool(successful))),
+        ])
+
+    def record_cycle(self, agent, model, task_success, metrics=None):
+        self._write([
+            ("INSERT INTO cycles (ts, agent, model, task_success, metrics) VALUES (?, ?, ?, ?, ?)",
+             (time.time(), agent, model, int(bool(task_success)), json.dumps(metrics) if metrics is not None else None)),
+            self._bump(agent, model, cycles=1, successful_cycles=int(bool(task_success))),
+        ])
+
+    @staticmethod
+    def _where(agent, model):
+        clauses, params = [], []
+        for column, value in (("agent", agent), ("model", model)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def totals(self, agent=None, model=None):
+        """Summed running totals, optionally for one agent and/or model."""
+        where, params = self._where(agent, model)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(upgrades), 0) AS upgrades, COALESCE(SUM(successful_upgrades), 0) AS successful_upgrades, "
+                "COALESCE(SUM(cycles), 0) AS cycles, COALESCE(SUM(successful_cycles), 0) AS successful_cycles FROM totals"
+                + where,
+                params
+            ).fetchone()
+        finally:
+            conn.close()
+        return dict(row)
+
+    def success_rate(self, task_success):
+        """Successful upgrades plus this task, over upgrades plus one (the agent_state.json formula)."""
+        totals = self.totals()
+        return (totals["successful_upgrades"] + (1 if task_success else 0)) / (totals["upgrades"] + 1)
+
+    def suggestions(self, agent=None, model=None, limit=20):
+        """Most recent upgrade suggestions, newest first."""
+        where, params = self._where(agent, model)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT ts, agent, model, suggestion, successful FROM upgrades"
+                + where
+                + " ORDER BY id DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row, successful=bool(row["successful"])) for row in rows]
+
+    def migrate_json(self, json_path):
+        """Import upgrades from a legacy agent_state.json once; the file itself is left in place."""
+        key = f"migrated:{Path(json_path).name}"
+        conn = self._connect()
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+        finally:
+            conn.close()
+
+        try:
+            with open(json_path) as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return 0
+
+        model = state.get("model_used") or ""
+        statements = []
+        for upgrade in state.get("upgrades", []):
+            successful = int(bool(upgrade.get("successful", True)))
+            statements.append((
+                "INSERT INTO upgrades (ts, agent, model, suggestion, successful, metrics) VALUES (?, ?, ?, ?, ?, NULL)",
+                (upgrade.get("timestamp") or time.time(), "", model, upgrade.get("suggestion", ""), successful)
+            ))
+            statements.append(self._bump("", model, upgrades=1, successful_upgrades=successful))
+        statements.append(("INSERT INTO meta (key, value) VALUES (?, ?)", (key, str(time.time()))))
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                conn.execute("ROLLBACK") # Another writer migrated it first
+                return 0
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return len(state.get("upgrades", []))
@@ -0,0 +1,145 @@
+import os
+import time
+import codecs
+import signal
+import selectors
+import subprocess
+
+READ_SIZE = 64 * 1024
+
+
+def exec_limits_from_env():
+    """Tool command limits from AGENT_BASH_TIMEOUT (seconds), AGENT_BASH_MAX_MB (output before the command is killed, 0 = no limit), AGENT_BASH_HEAD_KB and AGENT_BASH_TAIL_KB (output kept)."""
+    max_mb = float(os.getenv("AGENT_BASH_MAX_MB", "16"))
+    return {
+        'timeout': float(os.getenv("AGENT_BASH_TIMEOUT", "120")),
+        'max_bytes': int(max_mb * 1024 * 1024) or None,
+        'head_bytes': int(float(os.getenv("AGENT_BASH_HEAD_KB", "16")) * 1024),
+        'tail_bytes': int(float(os.getenv("AGENT_BASH_TAIL_KB", "48")) * 1024),
+    }
+
+
+class HeadTailBuffer:
+    """The first head_bytes and last tail_bytes of a stream; the middle is only counted.
+
+    With head_bytes=None everything is kept.
+    """
+
+    def __init__(self, head_bytes=None, tail_bytes=0):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        if self.head_bytes is None:
+            self.head += data
+            return
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes:
+            self.tail += data
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+    @property
+    def dropped(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self):
+        if not self.dropped:
+            return (self.head + self.tail).decode(errors="replace")
+        return (self.head.decode(errors="replace")
+                + f"\n[... {self.dropped} bytes of output omitted ...]\n"
+                + self.tail.decode(errors="replace"))
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL) # The command's children (builds, servers) go with it
+    except (AttributeError, ProcessLookupError, PermissionError):
+        process.kill()
+
+
+def run_streaming(cmd, cwd=None, env=None, timeout=None, max_bytes=None, head_bytes=None, tail_bytes=0, on_output=None):
+    """Run cmd, reading stdout and stderr as they are produced instead of after it exits.
+
+    Each stream is kept in a HeadTailBuffer, so memory stays bounded however
+    much the command prints. The command runs in its own process group; the
+    whole group is killed once it has run `timeout` seconds or printed more
+    than `max_bytes` in total. on_output(stream, text) sees every chunk as
+    it arrives ("stdout" or "stderr"), for live progress.
+
+    Returns {'stdout', 'stderr', 'exit_code', 'killed' (None, "timeout" or
+    "output_limit"), 'truncated', 'bytes', 'spawn_s', 'duration_s'}.
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+        start_new_session=True
+    )
+    spawned = time.perf_counter()
+    deadline = None if timeout is None else spawned + timeout
+    out, err = HeadTailBuffer(head_bytes, tail_bytes), HeadTailBuffer(head_bytes, tail_bytes)
+    streams = {
+        process.stdout.fileno(): ("stdout", out, codecs.getincrementaldecoder("utf-8")(errors="replace")),
+        process.stderr.fileno(): ("stderr", err, codecs.getincrementaldecoder("utf-8")(errors="replace")),
+    }
+    killed = None
+    total = 0
+
+    try:
+        with selectors.DefaultSelector() as selector:
+            for fd in streams:
+                selector.register(fd, selectors.EVENT_READ)
+            while selector.get_map() and not killed:
+                wait = None if deadline is None else deadline - time.perf_counter()
+                if wait is not None and wait <= 0:
+                    killed = "timeout"
+                    break
+                for key, _ in selector.select(wait):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fd)
+                        continue
+                    name, buffer, decoder = streams[key.fd]
+                    buffer.write(data)
+                    total += len(data)
+                    if on_output is not None:
+                        on_output(name, decoder.decode(data))
+                    if max_bytes and total > max_bytes:
+                        killed = "output_limit"
+                        break
+
+        if not killed:
+            # Both pipes are closed; the command itself may still be running
+            try:
+                process.wait(timeout=None if deadline is None else max(deadline - time.perf_counter(), 0))
+            except subprocess.TimeoutExpired:
+                killed = "timeout"
+    finally:
+        if killed or process.poll() is None:
+            _kill_group(process)
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+
+    return {
+        'stdout': out.text(),
+        'stderr': err.text(),
+        'exit_code': process.returncode,
+        'killed': killed,
+        'truncated': bool(out.dropped or err.dropped),
+        'bytes': total,
+        'spawn_s': spawned - started,
+        'duration_s': time.perf_counter() - started
+    }
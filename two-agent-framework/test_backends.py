@@ -0,0 +1,46 @@
+import threading
+
+from backends import OpenAIBackend
+
+
+def test_openai_backend_streams_chunks(openrouter):
+    base_url, _ = openrouter()
+    backend = OpenAIBackend("mock/model", api_key="test-key", base_url=base_url)
+    chunks = []
+
+    result = backend.run_prompt("hello", on_chunk=chunks.append)
+
+    assert result['success'], result['error']
+    assert result['streamed']
+    assert len(chunks) > 1
+    assert "".join(chunks) == result['output']
+    assert result['output'].startswith("Mock reply from mock/model")
+    assert {k.lower() for k in result['headers']} >= {"x-ratelimit-limit", "x-ratelimit-remaining"}
+    assert len(backend._history(None)) == 2 # The exchange is kept for the next prompt
+
+
+def test_clients_are_pooled_per_key_and_url(openrouter):
+    base_url, _ = openrouter()
+    first = OpenAIBackend("mock/a", api_key="test-key", base_url=base_url)
+    second = OpenAIBackend("mock/b", api_key="test-key", base_url=base_url)
+    other = OpenAIBackend("mock/a", api_key="other-key", base_url=base_url)
+
+    assert first.get_client("test-key", base_url) is second.get_client("test-key", base_url)
+    assert first.get_client("test-key", base_url) is not other.get_client("other-key", base_url)
+
+
+def test_cancelled_stream_stops_reading(openrouter):
+    base_url, _ = openrouter()
+    backend = OpenAIBackend("mock/model", api_key="test-key", base_url=base_url)
+    cancelled = threading.Event()
+    chunks = []
+
+    def on_chunk(text):
+        chunks.append(text)
+        cancelled.set() # Another model answered first
+
+    result = backend.complete("hello", on_chunk=on_chunk, cancelled=cancelled)
+
+    assert not result['success'] and result['cancelled']
+    assert len(chunks) == 1
+    assert len(backend._history(None)) == 0 # complete() never records the exchange
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from agent import Agent
+from cache import ResponseCache
+
+
+class EchoBackend:
+    """Counts model calls; replies are a function of the prompt."""
+
+    name = "echo"
+
+    def __init__(self):
+        self.calls = 0
+
+    def run_prompt(self, prompt, session_id=None, on_chunk=None, model=None, timeout=None):
+        self.calls += 1
+        return {'success': True, 'output': f"re: {prompt}", 'error': '', 'model_used': model}
+
+    def remember(self, prompt, output, session_id=None):
+        pass
+
+
+def _agent(tmp_path, name, cache):
+    return Agent(name, "Tester", None, "mock/model", backend=EchoBackend(), workspace_dir=tmp_path / name, cache=cache)
+
+
+def test_memory_tier_is_lru_and_backed_by_disk(tmp_path):
+    cache = ResponseCache(tmp_path, memory_entries=2)
+    for key in ("a", "b"):
+        cache.put(key, {'output': key})
+    cache.get("a") # Most recently used: "b" is evicted next
+    cache.put("c", {'output': "c"})
+
+    assert list(cache._memory) == ["a", "c"]
+    assert cache.get("b") == {'output': "b"} # Still on disk
+    assert list(cache._memory) == ["c", "b"]
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = ResponseCache(tmp_path, memory_entries=0, max_disk_bytes=400)
+    for index, key in enumerate(("old", "used", "new")):
+        cache.put(key, {'output': "x" * 100}) # 114 bytes each
+        os.utime(cache._path(key), (1000 + index, 1000 + index))
+    assert cache.get("old") is not None # Reading marks it as recently used
+
+    cache.put("extra", {'output': "x" * 100}) # 456 bytes: drop files until under 90% of the cap
+
+    assert cache.get("used") is None
+    assert cache.get("old") is not None and cache.get("extra") is not None
+    assert cache._disk_bytes <= 360
+
+
+def test_record_then_replay_serves_every_turn_without_the_model(tmp_path):
+    recorder = _agent(tmp_path, "rec", ResponseCache(tmp_path / "cache", mode="record"))
+    recorded = [recorder.opencode_run_prompt(prompt)['output'] for prompt in ("plan", "act", "plan")]
+    assert recorder.backend.calls == 3 # Record mode never serves hits, even for a repeated prompt
+
+    player = _agent(tmp_path, "play", ResponseCache(tmp_path / "cache", mode="replay"))
+    results = [player.opencode_run_prompt(prompt) for prompt in ("plan", "act", "plan")]
+    assert [r['output'] for r in results] == recorded
+    assert all(r['cached'] for r in results) and player.backend.calls == 0
+
+
+@pytest.mark.parametrize("prompt", ["other", "act"]) # "act" was recorded, but after "plan", not first
+def test_replay_miss_is_an_error_not_a_model_call(tmp_path, prompt):
+    recorder = _agent(tmp_path, "rec", ResponseCache(tmp_path / "cache", mode="record"))
+    recorder.opencode_run_prompt("plan")
+    recorder.opencode_run_prompt("act")
+
+    player = _agent(tmp_path, "play", ResponseCache(tmp_path / "cache", mode="replay"))
+    result = player.opencode_run_prompt(prompt)
+    assert not result['success'] and "Replay cache miss" in result['error']
+    assert player.backend.calls == 0
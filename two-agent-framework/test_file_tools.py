@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+import file_tools
+
+
+@pytest.fixture
+def ws(tmp_path):
+    workspace = tmp_path / "ws"
+    workspace.mkdir()
+    (tmp_path / "secret.txt").write_text("outside\n")
+    return workspace
+
+
+@pytest.mark.parametrize("file_path", ["../secret.txt", "a/../../secret.txt", "/etc/passwd"])
+def test_paths_outside_the_workspace_are_refused(ws, file_path):
+    with pytest.raises(ValueError):
+        file_tools.resolve_path(ws, file_path)
+    assert not file_tools.view_file(ws, file_path)['success']
+    assert not file_tools.write_file(ws, file_path, "x")['success']
+    assert (ws.parent / "secret.txt").read_text() == "outside\n"
+
+
+def test_symlinks_out_of_the_workspace_are_refused(ws):
+    os.symlink(ws.parent / "secret.txt", ws / "link.txt")
+    result = file_tools.view_file(ws, "link.txt")
+    assert not result['success'] and "outside the workspace" in result['error']
+
+
+@pytest.mark.parametrize("file_path", ["", ".", "sub", "sub/"])
+def test_writes_to_the_root_or_a_directory_are_refused_before_any_temp_file(ws, file_path, monkeypatch):
+    (ws / "sub").mkdir()
+    temp_dirs = []
+    mkstemp = file_tools.tempfile.mkstemp
+    monkeypatch.setattr(file_tools.tempfile, "mkstemp", lambda **kw: temp_dirs.append(kw["dir"]) or mkstemp(**kw))
+
+    assert not file_tools.write_file(ws, file_path, "x")['success']
+    assert not file_tools.edit_file(ws, file_path, "a", "b")['success']
+    assert temp_dirs == [] # Not even briefly next to the workspace
+    assert os.listdir(ws) == ["sub"]
+
+
+def test_write_edit_and_view_round_trip(ws):
+    assert file_tools.write_file(ws, "src/app.py", "a = 1\nb = 1\n")['success']
+    assert not file_tools.edit_file(ws, "src/app.py", "= 1", "= 2")['success'] # Ambiguous
+    assert file_tools.edit_file(ws, "src/app.py", "= 1", "= 2", replace_all=True)['success']
+    assert file_tools.view_file(ws, "src/app.py", start_line="2", end_line=2)['output'] == "b = 2\n"
+    assert os.listdir(ws / "src") == ["app.py"] # No temp files left
@@ -0,0 +1,53 @@
+from memory import DEFAULT_CONTEXT_BUDGET, SUMMARY_ROLE, ConversationMemory, estimate_tokens
+
+
+def _turns(memory, count, chars=400):
+    for index in range(count):
+        memory.add("user" if index % 2 else "assistant", f"turn {index} " + "x" * chars)
+
+
+def test_budget_defaults_on_and_zero_opts_out(monkeypatch):
+    monkeypatch.delenv("AGENT_CONTEXT_BUDGET", raising=False)
+    assert ConversationMemory.from_env().max_tokens == DEFAULT_CONTEXT_BUDGET
+    monkeypatch.setenv("AGENT_CONTEXT_BUDGET", "0")
+    assert ConversationMemory.from_env().max_tokens is None
+
+
+def test_compaction_keeps_the_first_and_recent_messages_within_budget():
+    memory = ConversationMemory(max_tokens=1000, keep_first=1, keep_recent=4)
+    memory.add("system", "You are Alpha. Mission: ship it.")
+    _turns(memory, 60)
+
+    assert memory.compactions > 0
+    assert memory.total_tokens <= 1000 + estimate_tokens("x" * 400) # Over by at most the newest message
+    assert memory.total_tokens == sum(estimate_tokens(m["content"]) for m in memory)
+    assert memory[0] == {"role": "system", "content": "You are Alpha. Mission: ship it."}
+    assert memory[1]["role"] == SUMMARY_ROLE
+    assert [m["content"].split()[1] for m in memory[-4:]] == ["56", "57", "58", "59"]
+
+
+def test_repeated_compaction_merges_into_one_summary():
+    memory = ConversationMemory(max_tokens=600, keep_first=1, keep_recent=2)
+    memory.add("system", "prompt")
+    _turns(memory, 40, chars=200)
+
+    summaries = [m for m in memory if m["role"] == SUMMARY_ROLE]
+    assert len(summaries) == 1
+    assert summaries[0]["content"].count("[Summary of earlier messages]") == 1
+    # Previews run right up to the first message still kept verbatim
+    first_kept = int(memory[2]["content"].split()[1])
+    assert f"turn {first_kept - 1} " in summaries[0]["content"]
+
+
+def test_unbounded_memory_never_compacts():
+    memory = ConversationMemory(max_tokens=None)
+    _turns(memory, 200)
+    assert len(memory) == 200 and memory.compactions == 0
+
+
+def test_chat_messages_send_the_summary_as_a_system_message():
+    memory = ConversationMemory(max_tokens=300, keep_first=1, keep_recent=2)
+    memory.add("system", "prompt")
+    _turns(memory, 10)
+    roles = [m["role"] for m in memory.to_chat_messages()]
+    assert roles[:2] == ["system", "system"] and SUMMARY_ROLE not in roles
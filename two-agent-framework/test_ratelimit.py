@@ -0,0 +1,51 @@
+from backends import OpenAIBackend
+from policy import RequestPolicy
+from ratelimit import RateLimiter, is_rate_limited, parse_retry_after, retry_after_from_text
+
+
+def test_429_retry_after_pauses_the_bucket(openrouter, tmp_path):
+    base_url, stats = openrouter(limit=1, window=60.0)
+    backend = OpenAIBackend("mock/model", api_key="test-key", base_url=base_url)
+    limiter = RateLimiter(tmp_path / "a")
+    policy = RequestPolicy(["mock/model"], retries=0, timeout=0.5, limiter=limiter, api_key="test-key")
+
+    assert policy.run(backend, "first")['success']
+    # X-RateLimit-Remaining: 0 already paused the bucket, so the next prompt is never sent
+    assert limiter.wait_time("test-key", "mock/model") > 30
+    result = policy.run(backend, "second")
+    assert result['rate_limited'] and stats['429'] == 0
+
+    # A limiter without that history (another machine) gets the 429 and honours its Retry-After
+    other = RateLimiter(tmp_path / "b")
+    result = RequestPolicy(["mock/model"], retries=0, timeout=0.5, limiter=other, api_key="test-key").run(backend, "third")
+    assert not result['success'] and result['rate_limited']
+    assert stats['429'] == 1 # Paused after it instead of sending the final queued attempt
+    assert other.wait_time("test-key", "mock/model") > 30
+
+
+def test_rate_limited_result_carries_retry_after(openrouter, tmp_path):
+    base_url, _ = openrouter(limit=0)
+    result = OpenAIBackend("mock/model", api_key="test-key", base_url=base_url).complete("hello")
+
+    assert result['rate_limited']
+    assert {k.lower(): v for k, v in result['headers'].items()}["retry-after"] == "60"
+    limiter = RateLimiter(tmp_path)
+    assert 55 < limiter.feedback("test-key", "mock/model", status=429, headers=result['headers']) <= 60
+
+
+def test_retry_after_forms():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0) == 10.0
+    assert parse_retry_after("soon") is None
+    # The OpenCode CLI only reports provider limits as text
+    assert is_rate_limited("Error: 429 Too Many Requests") and not is_rate_limited("exit status 1")
+    assert retry_after_from_text("rate limited, retry after 1500ms") == 1.5
+    assert retry_after_from_text("Retry-After: 12") == 12.0
+
+
+def test_a_bare_429_pauses_for_the_default_penalty(tmp_path):
+    limiter = RateLimiter(tmp_path, burst=2)
+    assert limiter.reserve("key", "model") == 0
+    assert 15 < limiter.feedback("key", "model", status=429) <= 20
+    assert limiter.reserve("key", "model") > 15
+    assert limiter.reserve("key", "other-model") == 0 # Only that model's bucket is paused
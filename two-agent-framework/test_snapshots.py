@@ -0,0 +1,88 @@
+import os
+import threading
+
+from snapshots import SnapshotStore
+
+
+def _tree(root):
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path) as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def test_store_lives_next_to_the_workspace(tmp_path):
+    store = SnapshotStore(tmp_path / "ws")
+    assert store.root == tmp_path / "ws.snapshots"
+
+
+def test_restore_undoes_changes_additions_and_removals(tmp_path):
+    ws = tmp_path / "ws"
+    (ws / "src").mkdir(parents=True)
+    (ws / "src" / "a.py").write_text("a = 1\n")
+    (ws / "keep.txt").write_text("keep\n")
+    (ws / "gone.txt").write_text("gone\n")
+    store = SnapshotStore(ws)
+    before = _tree(ws)
+    first = store.snapshot("before")
+
+    (ws / "src" / "a.py").write_text("a = 2\n")
+    (ws / "gone.txt").unlink()
+    (ws / "new").mkdir()
+    (ws / "new" / "b.py").write_text("b = 1\n")
+    second = store.snapshot("after")
+    assert second["linked"] == 1 # keep.txt is shared with the first snapshot
+
+    restored = store.restore(first["id"])
+    assert _tree(ws) == before
+    assert restored["restored"] == 2 and restored["removed"] == 2 # new/b.py and new/
+
+    # The restored tree is the new baseline: nothing is copied again, and the later snapshot still restores
+    third = store.snapshot("restored")
+    assert third["copied"] == 0 and third["linked"] == 3
+    store.restore(second["id"])
+    assert (ws / "src" / "a.py").read_text() == "a = 2\n"
+    assert (ws / "new" / "b.py").read_text() == "b = 1\n"
+    assert not (ws / "gone.txt").exists()
+
+
+def test_same_size_rewrite_keeping_mtime_is_copied(tmp_path):
+    ws = tmp_path / "ws"
+    ws.mkdir()
+    path = ws / "a.txt"
+    path.write_text("one")
+    store = SnapshotStore(ws)
+    first = store.snapshot()
+    st = path.stat()
+    path.write_text("two")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns)) # touch -r / cp -p
+
+    assert store.snapshot()["copied"] == 1
+    store.restore(first["id"])
+    assert path.read_text() == "one"
+
+
+def test_separate_stores_on_one_workspace_do_not_collide(tmp_path):
+    ws = tmp_path / "ws"
+    ws.mkdir()
+    for index in range(100):
+        (ws / f"f{index}").write_text(str(index))
+    errors = []
+
+    def work(store):
+        for _ in range(10):
+            try:
+                store.snapshot()
+            except OSError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(SnapshotStore(ws),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert [s["id"] for s in SnapshotStore(ws).list()] == [f"{n:06d}" for n in range(1, 21)]
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+import pytest
+
+from stream_exec import HeadTailBuffer, run_streaming
+
+
+def _running(pid):
+    # A killed child can linger as a zombie until something reaps it; that counts as stopped
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            state = f.read().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state not in ("Z", "X")
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="reads process state from /proc")
+def test_timeout_kills_the_whole_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    # The shell starts a background child that would outlive a plain kill of the shell
+    script = f"sleep 30 & echo $! > {pid_file}; echo started; wait"
+    started = time.monotonic()
+
+    run = run_streaming(["sh", "-c", script], timeout=0.5)
+
+    assert time.monotonic() - started < 5
+    assert run['killed'] == "timeout"
+    assert run['stdout'] == "started\n" # Output printed before the kill is kept
+    child = int(pid_file.read_text())
+    deadline = time.monotonic() + 2
+    while _running(child) and time.monotonic() < deadline:
+        time.sleep(0.05) # SIGKILL is delivered asynchronously
+    assert not _running(child)
+
+
+def test_output_limit_kills_a_runaway_command():
+    code = "import sys\nwhile True: sys.stdout.write('y' * 4096)"
+    run = run_streaming([sys.executable, "-c", code], timeout=10, max_bytes=1024 * 1024, head_bytes=100, tail_bytes=100)
+
+    assert run['killed'] == "output_limit"
+    assert run['bytes'] > 1024 * 1024
+    assert run['truncated']
+    assert "bytes of output omitted" in run['stdout'] and len(run['stdout']) < 300
+
+
+def test_output_streams_while_the_command_runs():
+    seen = []
+    code = "import sys, time\nprint('one', flush=True)\ntime.sleep(0.3)\nprint('two', file=sys.stderr, flush=True)"
+    run = run_streaming([sys.executable, "-c", code], timeout=10,
+                        on_output=lambda stream, text: seen.append((stream, text, time.monotonic())))
+
+    assert run['exit_code'] == 0 and run['killed'] is None
+    assert "".join(text for stream, text, _ in seen if stream == "stdout") == "one\n"
+    assert "".join(text for stream, text, _ in seen if stream == "stderr") == "two\n"
+    first_stderr = next(at for stream, _, at in seen if stream == "stderr")
+    assert first_stderr - seen[0][2] > 0.2 # stdout arrived before the command finished
+
+
+def test_head_tail_buffer_keeps_both_ends():
+    buffer = HeadTailBuffer(head_bytes=4, tail_bytes=4)
+    for chunk in (b"abcdef", b"ghij", b"klmnop"):
+        buffer.write(chunk)
+    assert buffer.total == 16 and buffer.dropped == 8
+    assert buffer.text() == "abcd\n[... 8 bytes of output omitted ...]\nmnop"
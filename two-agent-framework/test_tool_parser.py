@@ -0,0 +1,35 @@
+import fake_opencode
+from tool_parser import ToolCallParser, extract_tool_calls
+
+
+def test_parser_finds_every_call_in_a_fake_opencode_reply(monkeypatch):
+    monkeypatch.setenv("FAKE_OPENCODE_TOOL_CALLS", "3")
+    reply = fake_opencode.scripted_reply(2)
+    expected = [f"opencode bash echo reply 2 call {index}" for index in range(3)]
+
+    text, calls = extract_tool_calls(reply)
+    assert [call.command for call in calls] == expected
+    assert text.startswith("Reply 2.") and "<|" not in text
+
+    # Streamed a few characters at a time, markers split across chunks
+    parser = ToolCallParser()
+    emitted = []
+    for start in range(0, len(reply), 7):
+        emitted.extend(parser.feed(reply[start:start + 7]))
+    parser.close()
+    assert [call.command for call in emitted] == expected
+    assert parser.text == text
+
+
+def test_parser_keeps_an_unclosed_block_as_text():
+    text, calls = extract_tool_calls("Working on it.<|tool calls begin|><|tool call begin|>function<|tool sep|>opencode bash ls")
+    assert calls == []
+    assert "opencode bash ls" in text
+
+
+def test_deepseek_fullwidth_markers_and_json_args():
+    reply = ("Plan.<｜tool▁calls▁begin｜><｜tool▁call▁begin｜>function<｜tool▁sep｜>opencode write notes.md\n"
+             "```json\n{\"content\": \"hi\"}\n```<｜tool▁call▁end｜><｜tool▁calls▁end｜>")
+    text, calls = extract_tool_calls(reply)
+    assert text == "Plan."
+    assert [(call.command, call.args) for call in calls] == [("opencode write notes.md", {"content": "hi"})]
@@ -0,0 +1,145 @@
+import re
+import json
+from collections import namedtuple
+
+ToolCall = namedtuple("ToolCall", ["command", "args"])
+
+CALLS_BEGIN = "<|tool calls begin|>"
+CALLS_END = "<|tool calls end|>"
+CALL_BEGIN = "<|tool call begin|>"
+CALL_END = "<|tool call end|>"
+SEP = "<|tool sep|>"
+_MARKERS = (CALLS_BEGIN, CALLS_END, CALL_BEGIN, CALL_END, SEP)
+
+# DeepSeek models emit the same markers with fullwidth bars and U+2581 spaces
+_FULLWIDTH = {m.replace("|", "｜").replace(" ", "▁"): m for m in _MARKERS}
+_ALL_MARKERS = _MARKERS + tuple(_FULLWIDTH)
+_MARKER_RE = re.compile("|".join(re.escape(m) for m in _ALL_MARKERS))
+_JSON_BLOCK_RE = re.compile(r"```json\s*(.*?)\s*(?:```|$)", re.DOTALL)
+
+
+def parse_call_content(content):
+    """Split one call body, e.g. 'function<|tool sep|>opencode run\\n```json\\n{...}\\n```', into (command, args)."""
+    content = content.strip()
+    if content.startswith("function"):
+        content = content[len("function"):].lstrip()
+    if content.startswith(SEP):
+        content = content[len(SEP):]
+    content = content.strip()
+
+    command_line, json_args = content, None
+    match = _JSON_BLOCK_RE.search(content)
+    if match:
+        command_line = content[:match.start()].strip()
+        try:
+            json_args = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            print(f"Warning: Could not parse JSON arguments for tool call: {match.group(1)}")
+    return ToolCall(command_line, json_args)
+
+
+class ToolCallParser:
+    """Incremental parser for tool-call blocks in a streamed model reply.
+
+    feed() takes chunks in arrival order and returns each tool call as soon as
+    its block closes, so execution can start before the reply is finished.
+    Every call in every block is returned, not just the first. Text outside the
+    blocks accumulates in `text`.
+    """
+
+    def __init__(self):
+        self._pending = "" # Unconsumed input (may end in a partial marker)
+        self._text = []
+        self._block = [] # Raw text of the open block since its last finished call
+        self._call = None # Body of the open call, or None
+        self._in_block = False
+        self.calls = []
+
+    @property
+    def text(self):
+        return "".join(self._text).strip()
+
+    def _partial_marker_len(self, s):
+        # Length of the longest suffix of s that could still grow into a marker
+        for length in range(min(len(s), max(len(m) for m in _ALL_MARKERS) - 1), 0, -1):
+            tail = s[-length:]
+            if any(m.startswith(tail) for m in _ALL_MARKERS):
+                return length
+        return 0
+
+    def _consume_text(self, s):
+        if self._call is not None:
+            self._call.append(s)
+        elif self._in_block:
+            pass # Whitespace between calls
+        else:
+            self._text.append(s)
+        if self._in_block:
+            self._block.append(s)
+
+    def _finish_call(self, emitted):
+        if self._call is not None:
+            call = parse_call_content("".join(self._call))
+            self._call = None
+            self._block = [] # Only the unfinished remainder of a block is kept
+            self.calls.append(call)
+            emitted.append(call)
+
+    def feed(self, chunk):
+        """Consume a chunk and return the tool calls it completed."""
+        emitted = []
+        s = self._pending + chunk
+        pos = 0
+        while True:
+            match = _MARKER_RE.search(s, pos)
+            if not match:
+                break
+            self._consume_text(s[pos:match.start()])
+            marker = _FULLWIDTH.get(match.group(), match.group())
+            raw = match.group()
+            pos = match.end()
+
+            if marker == CALLS_BEGIN and not self._in_block:
+                self._in_block = True
+                self._block = [raw]
+                continue
+            if self._in_block:
+                self._block.append(raw)
+            if marker == CALL_BEGIN and self._in_block:
+                self._finish_call(emitted) # A missing call-end still closes the previous call
+                self._call = []
+            elif marker == CALL_END:
+                self._finish_call(emitted)
+            elif marker == CALLS_END and self._in_block:
+                self._finish_call(emitted)
+                self._in_block = False
+                self._block = []
+            elif marker == SEP and self._call is not None:
+                self._call.append(SEP)
+            elif self._call is not None:
+                self._call.append(raw) # Stray marker inside a call body
+            elif not self._in_block:
+                self._text.append(raw) # Stray marker outside a block
+
+        rest = s[pos:]
+        keep = self._partial_marker_len(rest)
+        self._consume_text(rest[:len(rest) - keep])
+        self._pending = rest[len(rest) - keep:]
+        return emitted
+
+    def close(self):
+        """Flush at end of stream. A call that never closed is kept as plain text, not run."""
+        self._consume_text(self._pending)
+        self._pending = ""
+        if self._in_block:
+            self._text.append("".join(self._block))
+            self._in_block = False
+            self._call = None
+
+
+def extract_tool_calls(response_content):
+    """Parse a complete reply; returns (cleaned_response, [ToolCall, ...])."""
+    parser = ToolCallParser()
+    parser.feed(response_content)
+    parser.close()
+    return parser.text, parser.calls